@@ -46,12 +46,34 @@ import time
 import numpy as np
 import tweepy
 import calendar
-import json
-import seaborn as sns
 import math
 import matplotlib.pyplot as plt
 
-get_ipython().run_line_magic('matplotlib', 'inline')
+from wrangling.cleaning import (CLIENT_NAMES, IMAGE_RULES, STAGE_COLUMNS, STAGE_LOOKUP, STAGE_PRIORITY,
+                                TWEET_RULES, add_calendar_columns, add_ratings, clean_frame,
+                                resolve_dog_stage, stage_mask, stage_names)
+from wrangling.charts import (chart_figure, chart_inputs, density_table, render_charts, share_table,
+                              stage_weekday_table, weekday_table, year_month_table)
+from wrangling.cube import build_cube, cube_counts, load_cube, save_cube
+from wrangling.download import cached_download
+from wrangling.gather import gather_tweets
+from wrangling.json_backend import dumps
+from wrangling.master import refresh_master, write_state
+from wrangling.merge import join_sources
+from wrangling.pipeline import wrangling_pipeline
+from wrangling.profiling import Profiler
+from wrangling.schema import apply_schema, memory_report
+from wrangling.storage import load_master, save_master
+from wrangling.stub_api import StubTwitterAPI, load_tweets
+from wrangling.ledger import DELETED, FETCHED, TweetLedger
+from wrangling.tweet_index import TweetIndex
+from wrangling.tweet_json import read_tweet_json
+
+# the magic and display only exist in Jupyter, the exported script runs without them
+if 'get_ipython' in globals():
+    get_ipython().run_line_magic('matplotlib', 'inline')
+else:
+    display = print
 
 # ## Data Gathering
 # <a id='## Data-Gathering'></a>
@@ -90,24 +112,16 @@ if not os.path.exists(folder_name):
 # The website address to programmatically download data from
 url = 'https://d17h27t6h515a5.cloudfront.net/topher/2017/August/599fd2ad_image-predictions/image-predictions.tsv'
 
-# To download tsv file programmatically using request library
-response = requests.get(url)
+# To download tsv file programmatically using request library. The file is streamed
+# to a content-addressed cache in the folder and only downloaded again when it changed
+image_predictions_path = cached_download(url, cache_dir = folder_name)
 
 
 # In[12]:
 
 
-# To access the content and write to file
-
-with open(os.path.join(folder_name, url.split('/')[-1]), mode ='wb') as file:
-    file.write(response.content)
-
-
-# In[13]:
-
-
 # To load downloaded tab separated value (tsv) file using pandas
-image_df = pd.read_csv('image-predictions.tsv', sep='\t')
+image_df = pd.read_csv(image_predictions_path, sep='\t')
 
 
 # #### Twitter API data
@@ -145,21 +159,54 @@ api = tweepy.API(auth, wait_on_rate_limit = True)
 
 
 # The unique tweet_id in tweeter_df dataframe
-unique_twt_ids = [tweeter_df['tweet_id'].unique()]
-
-#save the gathered data to a file
-with open("tweet_json.txt", "w") as file:
-    for tweet_id in unique_twt_ids:
-        print(f"Gather id: {tweet_id}")
-        try:
-            #get all the twitter status - extended mode gives us additional data
-            tweet = api.get_status(tweet_id, tweet_mode = "extended")
-            #dump the json data to our file
-            json.dump(tweet._json, file)
-            #add a linebreak after each dump
-            file.write('\n')
-        except Exception as e:
-            print(f"Error - id: {tweet_id}" + str(e))
+unique_twt_ids = tweeter_df['tweet_id'].unique()
+
+# requests session signed with the same credentials tweepy uses
+session = requests.Session()
+session.auth = auth.apply_auth()
+
+#the ledger remembers which ids were already fetched, so a rerun only requests the missing ones
+ledger = TweetLedger('tweet_json.ledger.sqlite')
+pending_ids = ledger.pending(unique_twt_ids)
+print(f"{len(pending_ids)} of {len(unique_twt_ids)} ids still to gather")
+
+#append the gathered data to the file, earlier runs are kept
+with open("tweet_json.txt", "a", encoding = "utf-8") as file:
+
+    def write_batch(found, missing):
+        """ Write every gathered tweet of a batch as one json line and checkpoint it """
+        for tweet in found:
+            #dump the json data to our file with the fastest json library installed,
+            #followed by a linebreak
+            file.write(dumps(tweet) + '\n')
+        file.flush()
+        os.fsync(file.fileno())
+        ledger.mark([tweet['id'] for tweet in found], FETCHED)
+        ledger.mark(missing, DELETED)
+
+    #ids are looked up 100 at a time with several batches in flight
+    gathered = gather_tweets(pending_ids, session, max_workers = 4, on_batch = write_batch)
+
+ledger.mark_failed(gathered['failed'])
+print(f"Gathered {len(gathered['tweets'])} tweets, {len(gathered['deleted'])} deleted, "
+      f"{len(gathered['failed'])} failed at {gathered['ids_per_second']:.1f} ids/s")
+print(ledger.counts())
+ledger.close()
+
+
+# Without network access or credentials, the gathering can be tried against a local stand-in of the Twitter API. It answers lookups from the counts in tweeter_api_df.csv with a chosen latency, rate limit headers, and a share of transient server errors, so the batching, concurrency and backoff of the gatherer can be tested offline.
+
+# In[17]:
+
+
+# gathering from the local stub API with 50 ms latency and 5% server errors
+with StubTwitterAPI(load_tweets('tweeter_api_df.csv'), latency = 0.05, error_rate = 0.05) as stub:
+    stub_gathered = gather_tweets(unique_twt_ids, requests.Session(), base_url = stub.base_url,
+                                  max_workers = 8, backoff = 0.1)
+
+print(f"Gathered {len(stub_gathered['tweets'])} tweets, {len(stub_gathered['deleted'])} deleted, "
+      f"{len(stub_gathered['failed'])} failed at {stub_gathered['ids_per_second']:.1f} ids/s")
+stub.stats
 
 
 # In[17]:
@@ -167,27 +214,31 @@ with open("tweet_json.txt", "w") as file:
 
 # saving gathered data to dataframe
 
-tweeter_api_data = []
-
-# To read the created file
-with open('tweet_json.txt', 'r') as file:
-    for data in file:
-        try:
-            tweet = json.loads(data)
-            
-            # append a dictionary to the created list
-            tweeter_api_data.append({
-                'tweet_id' : tweet['id'], 'retweet_count':tweet['retweet_count'],
-                'favorite_count' : tweet['favorite_count']
-            })
-            
-        except:
-            print('error')
-            
-tweeter_api_df = pd.DataFrame(tweeter_api_data, columns = ['tweet_id', 'retweet_count', 'favorite_count'])
+# To read the created file, keeping only the fields we need from each tweet
+tweeter_api_df, bad_lines = read_tweet_json('tweet_json.txt',
+                                            columns = {'tweet_id': 'id', 'retweet_count': 'retweet_count',
+                                                       'favorite_count': 'favorite_count'})
+
+print(f"{len(bad_lines)} malformed lines")
+for line_number, message in bad_lines:
+    print(f"error - line {line_number}: {message}")
+
 tweeter_api_df
 
 
+# To look at a few tweets again later, the file does not have to be read from the start. The index below keeps the position of each tweet in the file, so single tweets or a list of ids are decoded straight from the file. The index is stored next to the file and only new lines are indexed when more tweets have been appended.
+
+# In[18]:
+
+
+# decoding only the tweets of the first ten archive ids
+with TweetIndex('tweet_json.txt') as tweet_index:
+    print(f"{len(tweet_index)} tweets indexed")
+    sample_tweets, sample_errors = tweet_index.select(unique_twt_ids[:10])
+
+sample_tweets
+
+
 # In[18]:
 
 
@@ -330,7 +381,7 @@ tweeter_api_df.describe()
 # -	platforms used for tweeting were extracted from html code
 # -	timestamp column made datetime datatype
 # -	in_reply_to_status_id, in_reply_to_user_id, retweeted_status_id, retweeted_status_user_id,, and  retweeted_status_timestamp columns were dropped
-# -	tweet_id columns in all the dataframes changed to object datatype
+# -	tweet_id columns in all the dataframes kept as int64, the compact integer key the dataframes are joined on
 # -	p1, p2, and p3 columns’ values were changed to lowercase and underscore replaced with space
 # -	column labels were made descriptive
 # -	doggo, pupper, floofer, and puppo values merged into newly created dog stage column
@@ -350,40 +401,33 @@ image_clean_df = image_df.copy()
 api_clean_df = tweeter_api_df.copy()
 
 
-# #### Quality Issues
-
-# >#### Issue #1: doggo, floofer, pupper, and puppo columns have values as 'None'
-
-# >#### Define: doggo, floofer, pupper, and puppo columns nan values represented as 'None' will be changed to nan with replace function.
-
-# #### Code
-
 # In[32]:
 
 
-# to replace 'None' to nan in doggo column
-twt_clean_df.doggo.replace('None', np.nan, inplace=True)
-
+# the quality issues below are written as rules in wrangling.cleaning, and all the
+# rules of a dataframe are applied in a single pass
+twt_clean_df = clean_frame(twt_clean_df, TWEET_RULES)
+image_clean_df = clean_frame(image_clean_df, IMAGE_RULES)
 
-# In[33]:
-
-
-# to replace 'None' to nan in floofer column
-twt_clean_df.floofer.replace('None', np.nan, inplace=True)
+# compact datatypes: categoricals for repeated text, nullable integers for counts
+twt_clean_df = apply_schema(twt_clean_df)
+image_clean_df = apply_schema(image_clean_df)
+api_clean_df = apply_schema(api_clean_df)
 
 
-# In[34]:
+# #### Quality Issues
 
+# >#### Issue #1: doggo, floofer, pupper, and puppo columns have values as 'None'
 
-# to replace 'None' to nan in pupper column
-twt_clean_df.pupper.replace('None', np.nan, inplace=True)
+# >#### Define: doggo, floofer, pupper, and puppo columns nan values represented as 'None' will be changed to nan with replace function.
 
+# #### Code
 
-# In[35]:
+# In[33]:
 
 
-# to replace 'None' to nan in puppo column
-twt_clean_df.puppo.replace('None', np.nan, inplace=True)
+# 'None' is replaced with nan in doggo, floofer, pupper, and puppo columns
+{column: TWEET_RULES['replace'][column] for column in STAGE_COLUMNS}
 
 
 # #### Test
@@ -397,43 +441,23 @@ twt_clean_df.head()
 
 # >#### Issue #2: platform sources embedded in html code in source column
 
-# >#### Define: iphone, twitter, vine, and tweet deck are sources of tweet embedded in url and html code. These sources will be extracted with replace function
+# >#### Define: iphone, twitter, vine, and tweet deck are sources of tweet embedded in url and html code. These sources will be extracted from the html code, and any other platform found later will be extracted the same way
 
 # #### Code
 
 # In[37]:
 
 
-# To know the distinct values of source column
-twt_clean_df.source.value_counts()
+# To know the distinct values of source column before cleaning
+tweeter_df.source.value_counts()
 
 
 # In[38]:
 
 
-# To extract iphone platform from source column
-twt_clean_df.source.replace('<a href="http://twitter.com/download/iphone" rel="nofollow">Twitter for iPhone</a>','iphone', inplace = True)
-
-
-# In[39]:
-
-
-# To extract vine platform from source column
-twt_clean_df.source.replace('<a href="http://vine.co" rel="nofollow">Vine - Make a Scene</a>','vine', inplace = True)
-
-
-# In[40]:
-
-
-# To extract twitter from source column
-twt_clean_df.source.replace('<a href="http://twitter.com" rel="nofollow">Twitter Web Client</a>', 'twitter', inplace = True)
-
-
-# In[41]:
-
-
-# To extract tweetdeck from source column
-twt_clean_df.source.replace('<a href="https://about.twitter.com/products/tweetdeck" rel="nofollow">TweetDeck</a>', 'tweetdeck', inplace = True)
+# platform names are taken from the text of each distinct html anchor in source column, and the link
+# goes to a new source_url column. These platforms keep the short names used in this analysis
+CLIENT_NAMES
 
 
 # #### Test
@@ -453,8 +477,8 @@ twt_clean_df.source.value_counts()
 # In[86]:
 
 
-# Removing new lines from  timestamp column
-twt_clean_df.timestamp = pd.to_datetime(twt_clean_df.timestamp)
+# converting timestamp column to datetime, read with the archive's fixed layout '2017-08-01 16:23:56 +0000'
+TWEET_RULES['to_datetime']
 
 
 # #### Test
@@ -476,7 +500,7 @@ twt_clean_df.info()
 
 
 # Removing columns that are not needed
-twt_clean_df.drop(['in_reply_to_status_id','in_reply_to_user_id','retweeted_status_id','retweeted_status_user_id','retweeted_status_timestamp'], axis = 1, inplace = True)
+TWEET_RULES['drop']
 
 
 # #### Test
@@ -490,15 +514,15 @@ twt_clean_df.info()
 
 # >#### Issue #5: tweet_id datatype is int64 instead of object
 
-# >#### Define: tweet_id datatype will be changed from int64 to object
+# >#### Define: tweet_id is an identifier, not a quantity. It is kept as int64 internally because it is compact and quick to join on, and it is never used in calculations
 
 # #### Code
 
 # In[47]:
 
 
-# changing tweet_id datatype from int64 to object
-twt_clean_df['tweet_id']= twt_clean_df['tweet_id'].astype(str)
+# keeping tweet_id datatype as int64
+TWEET_RULES['astype']
 
 
 # #### Test
@@ -519,8 +543,8 @@ twt_clean_df.info()
 # In[49]:
 
 
-# changing values in p1 column to lower case and replacing '-' with ''
-image_clean_df['p1'] = image_clean_df.p1.str.replace('_',' ').str.lower()
+# changing values in p1 column to lower case and replacing '_' with ' '
+IMAGE_RULES['normalize']
 
 
 # #### Test
@@ -529,7 +553,7 @@ image_clean_df['p1'] = image_clean_df.p1.str.replace('_',' ').str.lower()
 
 
 # confirming the changes
-image_clean_df.p1.sample(3)
+image_clean_df.first_prediction.sample(3)
 
 
 # >#### Issue #7: incosistency in p2 column case, some are uppr while some are lower and underscore in between words
@@ -541,8 +565,8 @@ image_clean_df.p1.sample(3)
 # In[51]:
 
 
-# changing values in p1 column to lower case and replacing '-' with ''
-image_clean_df['p2'] = image_clean_df.p2.str.replace('_',' ').str.lower()
+# p2 column is normalized by the same rule as p1
+IMAGE_RULES['normalize']
 
 
 # #### Test
@@ -551,7 +575,7 @@ image_clean_df['p2'] = image_clean_df.p2.str.replace('_',' ').str.lower()
 
 
 # confirming the changes
-image_clean_df.p2.sample(3)
+image_clean_df.second_prediction.sample(3)
 
 
 # >#### Issue #8: incosistency in p3 column case, some are uppr while some are lower and underscore in between words
@@ -563,8 +587,8 @@ image_clean_df.p2.sample(3)
 # In[53]:
 
 
-# changing values in p1 column to lower case and replacing '-' with ''
-image_clean_df['p3'] = image_clean_df.p3.str.replace('_',' ').str.lower()
+# p3 column is normalized by the same rule as p1
+IMAGE_RULES['normalize']
 
 
 # #### Test
@@ -573,20 +597,20 @@ image_clean_df['p3'] = image_clean_df.p3.str.replace('_',' ').str.lower()
 
 
 # confirming the changes
-image_clean_df.p3.sample(3)
+image_clean_df.third_prediction.sample(3)
 
 
 # >#### Issue #9: tweet_id datatype is int64 rather than object
 
-# >#### Define: tweet_id datatype will be changed int64 to object
+# >#### Define: tweet_id is kept as int64 internally, the same as in twt_clean_df, so the dataframes join on compact integer keys
 
 # #### Code
 
 # In[55]:
 
 
-# changing tweet_id datatype from int64 to object
-image_clean_df['tweet_id'] = image_clean_df['tweet_id'].astype(str)
+# keeping tweet_id datatype as int64
+IMAGE_RULES['astype']
 
 
 # #### Test
@@ -608,9 +632,7 @@ image_clean_df.info()
 
 
 # renaming of image_df columns
-image_clean_df.rename(columns={'jpg_url':'image_url', 'img_num':'image_number', 'img_num':'image_number', 'p1':'first_prediction', 'p1_conf': 'first_confidence', 'p1_dog': 'first_dog',
-                                  'p2': 'second_prediction', 'p2_conf': 'second_confidence', 'p2_dog': 'second_dog',
-                                  'p3': 'third_prediction', 'p3_conf': 'third_confidence', 'p3_dog': 'third_dog'}, inplace = True)
+IMAGE_RULES['rename']
 
 
 # #### Test
@@ -622,96 +644,63 @@ image_clean_df.rename(columns={'jpg_url':'image_url', 'img_num':'image_number',
 image_clean_df.columns
 
 
-# >#### Structural Issues
+# >#### Issue #11: rating_numerator and rating_denominator do not always match the rating in the text
 
-# >#### Issue 1: doggo, floofer, pupper, and puppo should not have separate columns
-
-# >#### Define: columns such as doggo, floofer, pupper, and puppo in twt_clean_df will be combined into one column named dog_stage
+# >#### Define: the rating of each tweet will be extracted from the text column. Where the text has more than one fraction (dates like 9/11 or 24/7), the first fraction over 10 is taken, then the first over a multiple of 10, then the first fraction. Tweets whose archive rating differs are flagged in a rating_mismatch column
 
 # #### Code
 
 # In[59]:
 
 
-# combining doggo, floofer, pupper, and puppo into dog_stage column
-twt_clean_df['dog_stage'] = twt_clean_df['doggo'
-                                        ].map(str) + twt_clean_df['floofer'
-                                                                 ].map(str) + twt_clean_df['pupper'
-                                                                                          ].map(str) + twt_clean_df['puppo'].map(str)
+# extracting ratings from text, keeping decimals like 13.5/10
+twt_clean_df = add_ratings(twt_clean_df)
 
 
-# In[60]:
-
-
-# To know distinct values in dog_stage column 
-twt_clean_df.dog_stage.value_counts()
-
-
-# In[61]:
-
-
-# function to separate combined values of pupper, doggo, floofer, and puppo columns in dog_stage column
-def dog_stage(old_value, new_value):
-    """ Combined values of pupper, doggo, floofer, and puppo columns in 
-    dog_stage column were distinctly separated    
-    """
-    twt_clean_df.dog_stage.replace(old_value, new_value, inplace = True)
-
-
-# In[62]:
-
-
-# replacing dog stage column value
-dog_stage('nannannannan', np.nan)
-
-
-# In[63]:
-
-
-# replacing dog stage column value
-dog_stage('nannanpuppernan', 'pupper')
-
+# #### Test
 
-# In[64]:
+# In[60]:
 
 
-# replacing dog stage column value
-dog_stage('doggonannannan', 'doggo')
+# tweets whose archive rating does not match the rating in the text
+twt_clean_df.loc[twt_clean_df.rating_mismatch, ['text', 'rating_numerator', 'rating_denominator',
+                                                'text_rating_numerator', 'text_rating_denominator']]
 
 
-# In[65]:
+# >#### Structural Issues
 
+# >#### Issue 1: doggo, floofer, pupper, and puppo should not have separate columns
 
-# replacing dog stage column value
-dog_stage('nannannanpuppo', 'puppo')
+# >#### Define: columns such as doggo, floofer, pupper, and puppo in twt_clean_df will be combined into one column named dog_stage
 
+# #### Code
 
-# In[66]:
+# In[59]:
 
 
-# replacing dog stage column value
-dog_stage('doggonanpuppernan', 'doggo')
+# combining doggo, floofer, pupper, and puppo into one small integer, one bit for each stage
+twt_clean_df['dog_stage_mask'] = stage_mask(twt_clean_df)
 
 
-# In[67]:
+# In[60]:
 
 
-# replacing dog stage column value
-dog_stage('nanfloofernannan', 'floofer')
+# To know distinct combinations of stages in dog_stage_mask column
+twt_clean_df.dog_stage_mask.value_counts().rename(index = stage_names)
 
 
-# In[68]:
+# In[61]:
 
 
-# replacing dog stage column value
-dog_stage('doggonannanpuppo', 'doggo')
+# dog stage kept for each of the 16 combinations, doggo is kept first when a tweet names more than one
+{stage_names(mask): (STAGE_PRIORITY[code] if code >= 0 else np.nan) for mask, code in enumerate(STAGE_LOOKUP)}
 
 
-# In[69]:
+# In[62]:
 
 
-# replacing dog stage column value
-dog_stage('doggofloofernannan', 'doggo')
+# looking up the dog stage of every tweet from its mask
+twt_clean_df['dog_stage'] = resolve_dog_stage(twt_clean_df['dog_stage_mask'])
 
 
 # #### Test
@@ -732,22 +721,9 @@ twt_clean_df.dog_stage.value_counts()
 # In[88]:
 
 
-# extracting names of the week from timestamp
-twt_clean_df['day_name'] = twt_clean_df['timestamp'].dt.day_name()
-
-
-# In[89]:
-
-
-# extracting names of month in calendar year from timestamp
-twt_clean_df['month'] = pd.to_datetime(twt_clean_df['timestamp']).dt.strftime('%B')
-
-
-# In[90]:
-
-
-# extracting year_month from timestamp
-twt_clean_df['year_month'] = pd.to_datetime(twt_clean_df["timestamp"]).dt.to_period('M')
+# extracting names of the week, names of month, and year_month from timestamp. They are looked up
+# once from the integer parts of the timestamp and stored as categorical and period columns
+twt_clean_df = add_calendar_columns(twt_clean_df)
 
 
 # #### Test
@@ -767,17 +743,18 @@ twt_clean_df.sample(2)
 # In[75]:
 
 
-# changing tweet_id datatype from int64 to object
-api_clean_df['tweet_id']= api_clean_df['tweet_id'].astype(str)
+# tweet_id of api_clean_df is int64 like the other dataframes
+api_clean_df.dtypes
 
 
 # In[92]:
 
 
-# merging of dataframes
-twitter_archive_master = pd.merge(pd.merge(twt_clean_df, image_clean_df, on ='tweet_id', how='left'), api_clean_df, on='tweet_id', how='left')
+# merging of dataframes, image_clean_df and api_clean_df are joined to twt_clean_df on tweet_id in one step
+merged_df, join_report = join_sources(twt_clean_df, {'image': image_clean_df, 'api': api_clean_df})
 
-twitter_archive_master = pd.read_csv('twitter_archive_master.csv')
+# the joined columns keep the compact datatypes of their sources, apply_schema makes sure every column follows the schema
+twitter_archive_master = apply_schema(merged_df)
 
 
 # #### Test
@@ -789,6 +766,40 @@ twitter_archive_master = pd.read_csv('twitter_archive_master.csv')
 twitter_archive_master.sample(2)
 
 
+# In[94]:
+
+
+# the same merge with the datatypes the dataframes had before the schema: string tweet_ids,
+# object labels and flags, and 64 bit numbers (floats where the left merges leave gaps)
+def original_types(df):
+    types = {}
+    for column, dtype in df.dtypes.items():
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            continue
+        if pd.api.types.is_bool_dtype(dtype) or not pd.api.types.is_numeric_dtype(dtype):
+            types[column] = object
+        elif pd.api.types.is_integer_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+            types[column] = 'int64'
+        else:
+            types[column] = 'float64'
+    df = df.astype(types)
+    df['tweet_id'] = df['tweet_id'].astype(str).astype(object)
+    return df
+
+original_merged_df = pd.merge(original_types(twt_clean_df), original_types(image_clean_df), on = 'tweet_id', how = 'left')
+original_merged_df = pd.merge(original_merged_df, original_types(api_clean_df), on = 'tweet_id', how = 'left')
+
+# memory used by each column before and after the compact datatypes
+memory_report(original_merged_df, twitter_archive_master)
+
+
+# In[95]:
+
+
+# rows of each dataframe that matched a tweet in twt_clean_df, orphans, and tweets with no match
+join_report
+
+
 # >#### Issue #4: doggo, pupper, floofer, and puppo columns are no more needed
 
 # >#### Define: columns like doggo, pupper, floofer, and puppo will be dropped from twitter_archive_columns because the three columns are now combined in dog_stage column 
@@ -822,15 +833,34 @@ twitter_archive_master.info()
 # #### Storing data
 # <a id = '####Storing-Data'></a>
 # 
-# Since our datasets have been gathered, assessed, and cleaned. Let us now merge the datasets and save them a master dataset to a csv file named "twitter_archive_master.csv".
+# Since our datasets have been gathered, assessed, and cleaned. Let us now merge the datasets and save them a master dataset to a parquet file named "twitter_archive_master.parquet", which keeps the column datatypes, with a csv copy named "twitter_archive_master.csv".
 # 
 # After storing the datasets successfully, we will look for some insights in order to come up with some visualizations
 
 # In[82]:
 
 
-# storing of master dataframe 
-twitter_archive_master = twitter_archive_master.to_csv('twitter_archive_master.csv', index=False)
+# storing of master dataframe as parquet, which keeps the datatypes of the columns
+save_master(twitter_archive_master, 'twitter_archive_master.parquet')
+
+# csv copy of the master dataframe for sharing
+twitter_archive_master.to_csv('twitter_archive_master.csv', index=False)
+
+# counts of tweets and sums of retweets and favorites by year_month, day_name, dog_stage, and source,
+# read by all the insights below instead of the whole master dataframe
+save_cube(build_cube(twitter_archive_master), 'twitter_archive_master.cube.parquet')
+
+# hashes of the rows the master dataframe was built from, used by the incremental refresh
+write_state(tweeter_df, image_df, tweeter_api_df, 'twitter_archive_master.parquet')
+
+
+# When new tweets have been gathered, the stored master dataframe does not have to be rebuilt. Only tweets that are new or changed in any of the three dataframes since the last build are cleaned, merged, and written into the stored master dataframe.
+
+# In[83]:
+
+
+# incremental refresh of the stored master dataframe and its aggregate cube
+refresh_master(tweeter_df, image_df, tweeter_api_df, 'twitter_archive_master.parquet')
 
 
 # ## Analyzing and Visualizing Data
@@ -852,28 +882,38 @@ twitter_archive_master = twitter_archive_master.to_csv('twitter_archive_master.c
 # 
 # >6. What are the tweets platforms used and their tweets percentage?
 
-# In[83]:
+# ### Visualizations
+# <a id = '### Visualizations'></a>
 
+# In[84]:
 
-# loading twitter_archive_ master dataframe
-twitter_archive_master = pd.read_csv('twitter_archive_master.csv')
 
+# loading the aggregate cube of the master dataframe
+cube = load_cube('twitter_archive_master.cube.parquet')
 
-# ### Visualizations
-# <a id = '### Visualizations'></a>
 
 # - #### Is there any relationships between retweet count and favorite count, if so, what type?
 
 # In[84]:
 
 
+# loading only the columns needed for the chart from the stored master dataframe
+retweet_favorite = load_master('twitter_archive_master.parquet', columns = ['retweet_count', 'favorite_count'])
+
 # scatter plot for favorite count and retweet count relationship
-#sns.set_theme(color_codes = True)
-sns.regplot(x="retweet_count", y="favorite_count", fit_reg=False,
-            data = twitter_archive_master, color ='black')
-plt.xlabel('Retweet Count', size = 13)
-plt.ylabel('Favorite Count', size = 13)
-plt.title('Relationship between Favorite Count and Retweet Count', size = 13);
+chart_figure('retweet_favorite', retweet_favorite, plt.figure);
+
+
+# With many tweets the scatter plot turns into a blob of overlapping points. The density chart bins both counts on log scales, so it shows where most tweets lie and draws just as fast for millions of tweets. The correlation coefficients are shown on the chart.
+
+# In[85]:
+
+
+# retweet and favorite counts binned on log scales, with their correlation coefficients
+retweet_favorite_density = density_table(retweet_favorite)
+chart_figure('retweet_favorite_density', retweet_favorite_density, plt.figure)
+
+retweet_favorite_density.attrs
 
 
 # **Observations**  
@@ -886,12 +926,8 @@ plt.title('Relationship between Favorite Count and Retweet Count', size = 13);
 # In[97]:
 
 
-# to know number of tweets daily
-weekdays_tweet= twitter_archive_master.day_name.value_counts()
-
-# converting to dataframe and renaming columns
-weekdays_tweet = weekdays_tweet.to_frame().reset_index(
-).rename(columns={'index':'Day','day_name':'Count'})
+# to know number of tweets daily, as a dataframe with Day and Count columns
+weekdays_tweet = weekday_table(cube)
 
 weekdays_tweet
 
@@ -900,10 +936,7 @@ weekdays_tweet
 
 
 # chart for daily tweet
-weekdays_tweet.plot(kind = 'bar', x = 'Day', 
-                     color = 'royalblue',
-                   figsize = (6,6), title ='Tweet Count by Weekdays',
-                   fontsize = 10);
+chart_figure('weekday_tweets', weekdays_tweet, plt.figure);
 
 
 # **Observations**
@@ -916,34 +949,17 @@ weekdays_tweet.plot(kind = 'bar', x = 'Day',
 # In[99]:
 
 
-# to know number of tweets yearly by month
-year_month_tweet = twitter_archive_master.year_month.value_counts()
-
-# converting to dataframe and renaming of columns
-year_month_tweet = year_month_tweet.to_frame().reset_index(
-).rename(columns={'index':'Year_Month','year_month':'Count'}
-        ).sort_values('Year_Month')
+# to know number of tweets yearly by month, as a dataframe with Year_Month and Count columns
+year_month_tweet = year_month_table(cube)
 
 year_month_tweet 
 
 
-# In[100]:
-
-
-def bar_chart(data, x, color, title, figsize, fontsize):
-    """
-    This function with six arguments will plot a simple 
-    bar chart.
-    """
-    data.plot(kind = 'bar', x = x, title = title, color = color, figsize = figsize, fontsize = fontsize)
-    
-
-
 # In[102]:
 
 
 # chart for tweets of all the months
-bar_chart(year_month_tweet , 'Year_Month', 'royalblue', 'Number of Tweets by Yearly-Month', (8,4), 13)
+chart_figure('year_month_tweets', year_month_tweet, plt.figure);
 
 
 # **Observations**
@@ -958,20 +974,10 @@ bar_chart(year_month_tweet , 'Year_Month', 'royalblue', 'Number of Tweets by Yea
 
 
 # number of daily tweets for each dog 
-dog_daily_tweet = twitter_archive_master.groupby('day_name')['dog_stage'].value_counts()
-
-dog_daily_tweet = dog_daily_tweet.to_frame().rename(columns={'dog_stage': 'Count'}).reset_index()
+dog_daily_tweet = stage_weekday_table(cube)
 
 # dog stage chart for tweets of each weekday 
-ax = sns.barplot(x = 'day_name', 
-            y = 'Count', hue = 'dog_stage', 
-            data = dog_daily_tweet, 
-            order = ['Monday', 'Tuesday', 'Wednesday', 
-                     'Thursday', 'Friday', 'Saturday', 'Sunday'])
-ax.set_xlabel('Weekdays', size = 15)
-ax.set_ylabel('Number of Tweets', size = 15)
-ax.set_title('Dog Stage Tweet by Weekdays', size = 15)
-plt.legend(loc = 2, bbox_to_anchor = (1, 1));
+chart_figure('dog_stage_weekday', dog_daily_tweet, plt.figure);
 
 
 # **Observations**
@@ -985,17 +991,16 @@ plt.legend(loc = 2, bbox_to_anchor = (1, 1));
 # In[104]:
 
 
-# number of tweet for dog stages
-dog_stage = twitter_archive_master.dog_stage.value_counts()
+# number and percentage of tweets for dog stages, with the legend labels of the chart
+dog_stage = share_table(cube_counts(cube, 'dog_stage'))
+dog_stage
 
 
-plt.pie(dog_stage, startangle = 30, labeldistance = 1.2, 
-        counterclock = True, wedgeprops = {'width':0.4, 'linewidth': 1})
-plt.title('Dog Stages', fontweight = 'bold', fontsize = 15)
+# In[104]:
+
 
-plt.legend(['pupper  64%', 'doggo  26%', 'puppo  8%', 'floofer  2%'], 
-           bbox_to_anchor = (1,0.8), bbox_transform=plt.gcf().transFigure, loc = 'center right')
-plt.gca().axis('equal');
+# ring chart of the dog stages
+chart_figure('dog_stages', dog_stage, plt.figure);
 
 
 # **Observations**
@@ -1009,20 +1014,61 @@ plt.gca().axis('equal');
 # In[105]:
 
 
-# number of tweet sources
-tweet_source = twitter_archive_master.source.value_counts()
+# number and percentage of tweet sources, with the legend labels of the chart
+tweet_source = share_table(cube_counts(cube, 'source'))
+tweet_source
+
+
+# In[105]:
+
 
 # chart showing platforms used for tweeting
-plt.pie(tweet_source, counterclock = False)
-plt.title('Tweet Sources', fontweight = 'bold', fontsize = 15)
-plt.legend(['iphone  94%', 'vine  4%', 'twitter  1.8%', 'tweetdeck  0.2%'], 
-           bbox_to_anchor = (1.1,0.5), bbox_transform=plt.gcf().transFigure, loc = 'center right')
-plt.gca().axis('equal');
+chart_figure('tweet_sources', tweet_source, plt.figure);
 
 
 # **Observations**
 # 
-# The tweet platforms used were iphone, vine, twitter, and tweetdeck. Iphone recorded 94%, while vine recorded 4%. Twitter platform recorded 1.8% while tweetdeck settled for 0.2%. This analysis has shown that core fans of WeRateDogs are iphone users.
+# The tweet platforms used were iphone, vine, twitter, and tweetdeck. Iphone recorded 94%, while vine recorded 4%. Twitter platform recorded 1.4% while tweetdeck settled for 0.5%. This analysis has shown that core fans of WeRateDogs are iphone users.
+
+# #### Rendering the charts
+# 
+# All the charts above can also be rendered to png and svg files without showing them. The charts are drawn in parallel worker processes, and a chart whose data did not change since the last run is not drawn again.
+
+# In[106]:
+
+
+# headless rendering of all the charts to the charts folder
+render_charts(chart_inputs(cube, retweet_favorite), 'charts')
+
+
+# #### Running the pipeline
+# 
+# The steps of this notebook are also available as a pipeline of named stages, from reading the three datasets to rendering the charts. The output of each stage is kept on disk under a hash of its code, its files and its input stages, so running the pipeline again only recomputes the stages downstream of whatever changed. After changing a chart, only the chart stages run again.
+
+# In[107]:
+
+
+# stages that were computed and stages that were loaded from the .pipeline folder
+pipeline = wrangling_pipeline(images_path = image_predictions_path)
+outputs, pipeline_report = pipeline.run(['store', 'charts'])
+pipeline_report
+
+
+# To see where time and memory go, the pipeline can run under a profiler. It records the wall time, CPU time, growth of the peak memory, and rows in and out of each stage, cleaning rule, merge, csv export, and chart. The records are saved as JSON, as a trace that can be opened in Perfetto or speedscope, and as folded stacks for flame graphs.
+
+# In[108]:
+
+
+# profile of a full run of the pipeline, computing every stage again
+with Profiler() as profiler:
+    pipeline.run(['store', 'charts'], force = list(pipeline.stages))
+
+profiler.to_json('profile.json')
+profiler.to_trace('profile.trace.json')
+profiler.to_folded('profile.folded')
+
+pd.DataFrame(profiler.to_json())[['path', 'wall', 'cpu', 'peak_rss_growth', 'rows_in', 'rows_out']]
+
 
 # ## Resources:
 # <a id = '##Resources:'></a>
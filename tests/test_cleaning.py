@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from wrangling.cleaning import normalize_labels, parse_timestamps, split_sources
+
+
+def test_all_missing_columns():
+    series = pd.Series([np.nan, np.nan], dtype=object)
+    assert normalize_labels(series).isna().all()
+    assert split_sources(series).isna().all().all()
+
+
+def test_normalize_labels_merges_labels_that_clean_the_same():
+    labels = normalize_labels(pd.Series([None, 'Golden_Retriever', 'golden_retriever']))
+    assert list(labels.categories) == ['golden retriever']
+    assert labels.isna().tolist() == [True, False, False]
+
+
+def test_non_ascii_timestamps_are_parsed_by_pandas():
+    parsed = parse_timestamps(pd.Series(['2017-08-01 16:23:56 +0000', None]))
+    assert parsed.iloc[0] == pd.Timestamp('2017-08-01 16:23:56', tz='UTC') and parsed.isna().iloc[1]
+    with pytest.raises(ValueError, match='Unknown datetime string format'):
+        parse_timestamps(pd.Series(['2017-08-01 16:23:56 +0000', '2017-08-01 16:23:5\u00e9 +0000']))
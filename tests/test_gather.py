@@ -0,0 +1,53 @@
+import time
+
+import requests
+
+from wrangling.gather import LOOKUP_BATCH_SIZE, RateLimiter, gather_tweets
+from wrangling.stub_api import StubTwitterAPI
+
+IDS = list(range(1, 251))
+DELETED = [5, 150]
+
+
+def gather(stub, **kwargs):
+    batches = []
+    options = {'max_retries': 10, 'limiter': RateLimiter(max_requests=1000, window=1),
+               'sleep': lambda seconds: None, **kwargs}
+    with requests.Session() as session:
+        gathered = gather_tweets(IDS, session, base_url=stub.base_url,
+                                 on_batch=lambda found, missing: batches.append(len(found) + len(missing)),
+                                 **options)
+    return gathered, batches
+
+
+def stub_api(**kwargs):
+    tweets = {tweet_id: {'id': tweet_id, 'id_str': str(tweet_id)} for tweet_id in IDS}
+    return StubTwitterAPI(tweets, deleted=DELETED, **kwargs)
+
+
+def test_lookups_are_batched_and_deleted_ids_reported():
+    with stub_api() as stub:
+        gathered, batches = gather(stub)
+    assert sorted(batches) == [50, 100, 100]
+    assert all(size <= LOOKUP_BATCH_SIZE for size in batches)
+    assert stub.stats['requests'] == {'/statuses/lookup': 3}
+    assert sorted(tweet['id'] for tweet in gathered['tweets']) == [i for i in IDS if i not in DELETED]
+    assert sorted(gathered['deleted']) == DELETED
+    assert gathered['failed'] == {}
+
+
+def test_server_errors_are_retried():
+    with stub_api(error_rate=0.5, seed=1) as stub:
+        gathered, _ = gather(stub, batch_size=10)
+    assert any(status >= 500 for status in stub.stats['responses'])
+    assert gathered['failed'] == {}
+    assert len(gathered['tweets']) + len(gathered['deleted']) == len(IDS)
+
+
+def test_rate_limited_requests_are_retried_after_the_window():
+    # the reset header is in whole seconds, so the backoff has to wait for the window itself
+    with stub_api(rate_limit=2, window=0.5) as stub:
+        gathered, _ = gather(stub, max_workers=1, backoff=0.05, sleep=time.sleep)
+    assert stub.stats['responses'].get(429)
+    assert gathered['failed'] == {}
+    assert len(gathered['tweets']) + len(gathered['deleted']) == len(IDS)
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+import pytest
+
+from wrangling.parallel import parallel_clean
+
+
+def fail_on_last_partition(df):
+    if df.tweet_id.iloc[-1] == 99:
+        raise ValueError('cannot clean this partition')
+    return df
+
+
+def shared_blocks():
+    return set(os.listdir('/dev/shm'))
+
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='shared memory blocks are not listed in /dev/shm')
+def test_failed_partition_frees_the_finished_blocks():
+    df = pd.DataFrame({'tweet_id': range(100)})
+    before = shared_blocks()
+    with pytest.raises(ValueError):
+        parallel_clean(df, fail_on_last_partition, workers=2, partitions=4)
+    assert shared_blocks() == before
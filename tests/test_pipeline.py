@@ -0,0 +1,16 @@
+import os
+
+from wrangling.master import cube_path
+from wrangling.pipeline import wrangling_pipeline
+
+
+def test_store_reruns_only_when_a_stored_file_is_missing(tmp_path):
+    path = str(tmp_path / 'twitter_archive_master.parquet')
+    pipeline = wrangling_pipeline(images_path='image-predictions (1).tsv', api_path='tweeter_api_df.csv',
+                                  master_path=path, cache_dir=str(tmp_path / 'cache'))
+    assert 'store' in pipeline.run(['store'])[1]['computed']
+    assert pipeline.run(['store'])[1] == {'computed': [], 'loaded': ['store']}
+
+    os.remove(cube_path(path))
+    assert pipeline.run(['store'])[1]['computed'] == ['store']
+    assert os.path.exists(cube_path(path))
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+
+from wrangling.cube import build_cube, load_cube, save_cube
+from wrangling.master import build_master, cube_path, refresh_master, row_hashes, write_state
+from wrangling.pipeline import wrangling_pipeline
+from wrangling.storage import load_master, save_master
+
+
+@pytest.fixture(scope='module')
+def sources():
+    return (pd.read_csv('twitter-archive-enhanced.csv'),
+            pd.read_csv('image-predictions (1).tsv', sep='\t'),
+            pd.read_csv('tweeter_api_df.csv'))
+
+
+@pytest.fixture
+def stored(sources, tmp_path):
+    path = str(tmp_path / 'twitter_archive_master.parquet')
+    master = build_master(*sources)
+    save_master(master, path)
+    save_cube(build_cube(master), cube_path(path))
+    write_state(*sources, path)
+    return path
+
+
+def test_row_hashes_stay_uint64(sources):
+    tweets, images, api = sources
+    orphan = pd.DataFrame({'tweet_id': [1], 'retweet_count': [1], 'favorite_count': [1]})
+    hashes = row_hashes(tweets, images, pd.concat([api, orphan], ignore_index=True))
+    assert (hashes.dtypes == 'uint64').all()
+    assert (hashes.loc[hashes.index != 1] == row_hashes(tweets, images, api)).all().all()
+
+
+def test_one_row_change_refreshes_one_id(sources, stored):
+    tweets, images, api = sources
+    api = api.copy()
+    api.loc[3, 'favorite_count'] += 1
+    assert refresh_master(tweets, images, api, stored) == {'refreshed': 1, 'removed': 0}
+
+    master = load_master(stored)
+    cube = load_cube(cube_path(stored))
+    assert cube['favorite_count'].sum() == master['favorite_count'].sum()
+
+
+def test_orphans_and_removed_tweets_do_not_refresh_everything(sources, stored):
+    tweets, images, api = sources
+    orphan = pd.DataFrame({'tweet_id': [1], 'retweet_count': [1], 'favorite_count': [1]})
+    assert refresh_master(tweets, images, pd.concat([api, orphan], ignore_index=True), stored) \
+        == {'refreshed': 0, 'removed': 0}
+    assert refresh_master(tweets.iloc[2:], images, api, stored) == {'refreshed': 0, 'removed': 2}
+
+
+def test_refresh_rebuilds_the_cube_without_a_stored_master(sources, tmp_path):
+    path = str(tmp_path / 'twitter_archive_master.parquet')
+    save_cube(build_cube(build_master(*sources)), cube_path(path))
+    assert refresh_master(*sources, path)['refreshed'] == len(sources[0])
+
+    master = load_master(path)
+    cube = load_cube(cube_path(path))
+    assert cube['tweets'].sum() == len(master)
+
+
+def test_refresh_after_the_pipeline_stored_the_master(sources, tmp_path):
+    path = str(tmp_path / 'twitter_archive_master.parquet')
+    pipeline = wrangling_pipeline(images_path='image-predictions (1).tsv', api_path='tweeter_api_df.csv',
+                                  master_path=path, cache_dir=str(tmp_path / 'cache'))
+    pipeline.run(['store'])
+    tweets, images, api = sources
+    assert refresh_master(tweets, images, api, path) == {'refreshed': 0, 'removed': 0}
+
+    api = api.copy()
+    api.loc[3, 'retweet_count'] += 1
+    assert refresh_master(tweets, images, api, path) == {'refreshed': 1, 'removed': 0}
+    assert load_cube(cube_path(path))['retweet_count'].sum() == load_master(path)['retweet_count'].sum()
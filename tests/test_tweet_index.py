@@ -0,0 +1,37 @@
+import json
+
+from wrangling.tweet_index import TweetIndex
+
+
+def test_partly_appended_line_is_indexed_once_complete(tmp_path):
+    path = str(tmp_path / 'tweet_json.txt')
+    lines = [json.dumps({'id': tweet_id, 'retweet_count': tweet_id * 10}) for tweet_id in range(1, 5)]
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines[:3]) + '\n' + lines[3][:10])
+    with TweetIndex(path) as index:
+        assert list(index.ids) == [1, 2, 3]
+        assert not index.errors
+
+    with open(path, 'a') as file:
+        file.write(lines[3][10:] + '\n')
+    with TweetIndex(path) as index:
+        assert list(index.ids) == [1, 2, 3, 4]
+        assert index.get(4) == {'id': 4, 'retweet_count': 40}
+        assert not index.errors
+
+
+def test_select_reports_tweets_that_do_not_fit(tmp_path):
+    path = str(tmp_path / 'tweet_json.txt')
+    tweets = [{'id': 1, 'retweet_count': 10, 'favorite_count': 100, 'display_text_range': [0, 10]},
+              {'id': 2, 'retweet_count': None, 'favorite_count': 200, 'display_text_range': [0, 20]},
+              {'id': 3, 'favorite_count': 300, 'display_text_range': [0, 30]}]
+    with open(path, 'w') as file:
+        file.write(''.join(json.dumps(tweet) + '\n' for tweet in tweets))
+    with TweetIndex(path) as index:
+        df, errors = index.select([1, 2, 3, 4])
+        assert df.tweet_id.tolist() == [1]
+        assert errors == [(2, 'TypeError: retweet_count is NoneType, not int64'),
+                          (3, "KeyError: 'retweet_count'")]
+
+        df, errors = index.select([1, 2], columns=['id', 'display_text_range'])
+        assert df.display_text_range.tolist() == [[0, 10], [0, 20]] and not errors
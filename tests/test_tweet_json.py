@@ -0,0 +1,25 @@
+import json
+
+from wrangling.tweet_json import read_tweet_json
+
+
+def test_values_of_the_wrong_type_are_reported_by_line(tmp_path):
+    path = str(tmp_path / 'tweet_json.txt')
+    tweets = [{'id': 1, 'retweet_count': 10, 'favorite_count': 100},
+              {'id': 2, 'retweet_count': None, 'favorite_count': 200},
+              {'id': 3, 'retweet_count': 30, 'favorite_count': [300]},
+              {'id': 4, 'retweet_count': 40, 'favorite_count': 2 ** 70},
+              {'id': 5, 'retweet_count': 50, 'favorite_count': 500}]
+    for tweet in tweets:
+        tweet['retweeted'] = None if tweet['id'] == 1 else False
+    with open(path, 'w') as file:
+        file.write(''.join(json.dumps(tweet) + '\n' for tweet in tweets))
+
+    df, errors = read_tweet_json(path)
+    assert df.tweet_id.tolist() == [1, 5]
+    assert (df.dtypes == 'int64').all()
+    assert [line_number for line_number, _ in errors] == [2, 3, 4]
+
+    df, errors = read_tweet_json(path, columns=['id', 'retweeted'])
+    assert df.tweet_id.tolist() == [2, 3, 4, 5]
+    assert errors == [(1, 'TypeError: retweeted is NoneType, not bool')]
@@ -0,0 +1,4 @@
+"""
+Helpers used by the 'Wrangling Data from Twitter API and Other Sources'
+notebook to gather, clean, store and visualize the WeRateDogs datasets.
+"""
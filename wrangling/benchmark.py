@@ -0,0 +1,200 @@
+"""
+Benchmark of the cleaning, merge, aggregation and storage steps on
+synthetic archives (see ``wrangling.synthetic``).
+
+Each archive size runs in a fresh worker process, so its peak memory is not
+hidden by a larger size run before it. The steps are timed with the
+profiler, and every run is saved as a JSON file in the results directory
+together with the versions and commit it ran on, so runs can be compared
+with ``compare_runs``. From the command line:
+
+    python -m wrangling.benchmark --rows 10000 1000000 10000000
+    python -m wrangling.benchmark --compare benchmarks/run-a.json benchmarks/run-b.json
+
+``json_benchmark`` compares the JSON backends (see ``wrangling.json_backend``)
+on full extended mode tweet payloads:
+
+    python -m wrangling.benchmark --json 20000
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from wrangling.charts import chart_inputs
+from wrangling.cube import build_cube
+from wrangling.json_backend import BACKENDS, get_backend
+from wrangling.master import build_master
+from wrangling.profiling import Profiler, row_count, step
+from wrangling.storage import save_master
+from wrangling.synthetic import load_templates, synthetic_archives, synthetic_tweets
+from wrangling.tweet_json import read_tweet_json
+
+BENCHMARK_ROWS = [10000, 1000000, 10000000]
+RESULTS_DIR = 'benchmarks'
+
+
+def run_size(rows, seed=0, workers=1, csv=True):
+    """ Profile every step on a synthetic archive of ``rows`` tweets and return the records """
+    templates = load_templates()
+    with Profiler() as profiler, tempfile.TemporaryDirectory() as directory:
+        with step('generate') as record:
+            tweets, images, api = synthetic_archives(rows, templates, seed)
+            record['rows_out'] = len(tweets) + len(images) + len(api)
+        with step('build_master', rows_in=[tweets, images, api]) as record:
+            master = build_master(tweets, images, api, workers=workers)
+            record['rows_out'] = len(master)
+        del tweets, images, api
+        with step('build_cube', rows_in=master) as record:
+            cube = build_cube(master)
+            record['rows_out'] = len(cube)
+        with step('save_master', rows_in=master) as record:
+            save_master(master, os.path.join(directory, 'master.parquet'))
+            record['rows_out'] = len(master)
+        if csv:
+            with step('to_csv', rows_in=master) as record:
+                master.to_csv(os.path.join(directory, 'master.csv'), index=False)
+                record['rows_out'] = len(master)
+        with step('chart_inputs', rows_in=master) as record:
+            record['rows_out'] = row_count(chart_inputs(cube, master[['retweet_count', 'favorite_count']]))
+
+    records = profiler.to_json()
+    for record in records:
+        record['rows'] = rows
+        record['rows_per_second'] = record['rows_in'] / record['wall'] \
+            if record['rows_in'] and record['wall'] else None
+    return records
+
+
+def environment():
+    """ Versions, machine and commit the benchmark ran on """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'pyarrow': pa.__version__, 'machine': platform.machine(),
+            'cpus': os.cpu_count()}
+
+
+def run_benchmark(sizes=BENCHMARK_ROWS, seed=0, workers=1, csv=True, results_dir=RESULTS_DIR):
+    """
+    Run the benchmark for each archive size, save the run to ``results_dir``
+    and return the path of the saved run.
+    """
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = []
+    for rows in sizes:
+        # a new process for each size, so peak memory is measured from scratch
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.extend(pool.submit(run_size, rows, seed, workers, csv).result())
+
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"run-{started:%Y%m%d-%H%M%S}.json")
+    run = {'started': started.isoformat(), 'sizes': list(sizes), 'seed': seed, 'workers': workers,
+           **environment(), 'results': results}
+    with open(path, 'w') as file:
+        json.dump(run, file, indent=2)
+    return path
+
+
+def load_run(path):
+    """ Results of a saved run as a dataframe with one row per size and step """
+    with open(path, 'r') as file:
+        run = json.load(file)
+    return pd.DataFrame(run['results']).set_index(['rows', 'path'])
+
+
+def summary(path):
+    """ Wall time, throughput and peak memory of each step of a saved run """
+    results = load_run(path)
+    return results[['wall', 'cpu', 'rows_in', 'rows_out', 'rows_per_second', 'peak_rss']]
+
+
+def compare_runs(base, new):
+    """ Wall time of each size and step in two saved runs, and the ratio new / base """
+    comparison = pd.concat({'base': load_run(base)['wall'], 'new': load_run(new)['wall']}, axis=1)
+    comparison['ratio'] = comparison['new'] / comparison['base']
+    return comparison
+
+
+def json_benchmark(tweets=20000, seed=0):
+    """
+    Seconds each available JSON backend takes to encode ``tweets`` synthetic
+    tweet payloads, to decode them, and to read them back from a file with
+    read_tweet_json, with the decoding throughput and the speedup over the
+    standard library.
+    """
+    payloads = synthetic_tweets(tweets, seed=seed)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in BACKENDS:
+            _, loads, dumps = get_backend(name)
+            start = time.perf_counter()
+            lines = [dumps(tweet) for tweet in payloads]
+            encode = time.perf_counter() - start
+
+            data = [line.encode() for line in lines]
+            start = time.perf_counter()
+            for line in data:
+                loads(line)
+            decode = time.perf_counter() - start
+
+            path = os.path.join(directory, f'{name}.txt')
+            with open(path, 'wb') as file:
+                file.write(b'\n'.join(data) + b'\n')
+            start = time.perf_counter()
+            read_tweet_json(path, loads=loads)
+            read = time.perf_counter() - start
+            results.append({'backend': name, 'tweets': tweets, 'megabytes': sum(map(len, data)) / 1e6,
+                            'encode': encode, 'decode': decode, 'read_tweet_json': read})
+
+    results = pd.DataFrame(results).set_index('backend')
+    results['decode_mb_per_second'] = results['megabytes'] / results['decode']
+    for column in ['encode', 'decode', 'read_tweet_json']:
+        results[f'{column}_speedup'] = results.loc['stdlib', column] / results[column]
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=BENCHMARK_ROWS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--no-csv', action='store_true', help='skip writing the csv copy')
+    parser.add_argument('--results-dir', default=RESULTS_DIR)
+    parser.add_argument('--compare', nargs='*', metavar='RUN',
+                        help='compare two saved runs (the last two runs by default)')
+    parser.add_argument('--json', type=int, metavar='TWEETS',
+                        help='compare the JSON backends on this many tweet payloads instead')
+    args = parser.parse_args(argv)
+
+    with pd.option_context('display.width', 200, 'display.max_rows', None, 'display.max_columns', None):
+        if args.json is not None:
+            print(json_benchmark(args.json, args.seed))
+            return
+        if args.compare is not None:
+            runs = args.compare or sorted(glob.glob(os.path.join(args.results_dir, 'run-*.json')))[-2:]
+            if len(runs) != 2:
+                parser.error('two runs are needed to compare')
+            print(compare_runs(*runs))
+            return
+        path = run_benchmark(args.rows, args.seed, args.workers, not args.no_csv, args.results_dir)
+        print(summary(path))
+        print(f"saved {path}")
+
+
+if __name__ == '__main__':
+    main()
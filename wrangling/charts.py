@@ -0,0 +1,297 @@
+"""
+Insight charts drawn with the object oriented matplotlib API.
+
+Every chart is a function drawing on a given figure, so the same code shows
+the charts inline in the notebook (on a pyplot figure) and renders them
+headless to files (on a plain Agg figure). ``render_charts`` draws all of
+them in parallel worker processes and skips the charts whose input data and
+drawing code did not change since the last run.
+
+With many tweets the retweet / favorite scatter plot is replaced by a density
+chart. The counts are binned on log scales into a fixed grid up front, so
+drawing it takes the same time whatever the number of tweets.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+from wrangling.cleaning import DAY_NAMES
+from wrangling.cube import cube_counts
+from wrangling.profiling import Profiler, active_profiler, row_count, step
+
+MANIFEST_NAME = 'charts.json'
+
+# above this number of tweets the scatter plot gives way to the density chart
+DENSITY_THRESHOLD = 100000
+DENSITY_BINS = 60
+
+
+def weekday_table(cube):
+    """ Number of tweets on each day of the week """
+    return cube_counts(cube, 'day_name').to_frame().reset_index(
+    ).rename(columns={'day_name': 'Day', 'tweets': 'Count'})
+
+
+def year_month_table(cube):
+    """ Number of tweets in each month, in calendar order """
+    return cube_counts(cube, 'year_month').to_frame().reset_index(
+    ).rename(columns={'year_month': 'Year_Month', 'tweets': 'Count'}).sort_values('Year_Month')
+
+
+def stage_weekday_table(cube):
+    """ Number of tweets for each dog stage on each day of the week """
+    return cube_counts(cube, ['day_name', 'dog_stage']).to_frame().rename(
+        columns={'tweets': 'Count'}).reset_index()
+
+
+def share_table(counts):
+    """
+    Counts of a dimension with their share of the total in percent and the
+    legend label of each value, e.g. 'pupper  64%'. Shares under 2% keep
+    one decimal.
+    """
+    table = counts.rename('count').to_frame()
+    table['share'] = table['count'] / table['count'].sum() * 100
+    rounded = table['share'].where(table['share'] < 2, table['share'].round()).round(1)
+    table['label'] = counts.index.astype(str) + '  ' + rounded.map('{:g}'.format) + '%'
+    return table
+
+
+def correlations(data):
+    """
+    Pearson correlation of retweet and favorite counts, on the counts and on
+    their logarithms, and Spearman rank correlation.
+    """
+    counts = data[['retweet_count', 'favorite_count']].dropna().astype('float64')
+    logs = np.log1p(counts)
+    ranks = counts.rank()
+    return {
+        'pearson': float(counts['retweet_count'].corr(counts['favorite_count'])),
+        'pearson_log': float(logs['retweet_count'].corr(logs['favorite_count'])),
+        'spearman': float(ranks['retweet_count'].corr(ranks['favorite_count'])),
+    }
+
+
+def density_table(data, bins=DENSITY_BINS):
+    """
+    Number of tweets in a ``bins`` x ``bins`` grid over log10(1 + count) of
+    retweets (rows) and favorites (columns). The index and columns hold the
+    lower bin edges, and the correlations of the counts are kept in ``attrs``.
+    """
+    counts = data[['retweet_count', 'favorite_count']].dropna().astype('float64')
+    logs = np.log10(counts.to_numpy() + 1)
+    top = logs.max(axis=0) if len(logs) else np.zeros(2)
+    x_edges = np.linspace(0, max(top[0], 1), bins + 1)
+    y_edges = np.linspace(0, max(top[1], 1), bins + 1)
+    grid, x_edges, y_edges = np.histogram2d(logs[:, 0], logs[:, 1], bins=[x_edges, y_edges])
+
+    table = pd.DataFrame(grid.astype('int64'), index=pd.Index(x_edges[:-1], name='retweet_log10'),
+                         columns=pd.Index(y_edges[:-1], name='favorite_log10'))
+    table.attrs = {'x_top': float(x_edges[-1]), 'y_top': float(y_edges[-1]), 'tweets': len(counts),
+                   **correlations(counts)}
+    return table
+
+
+def bar_chart(ax, data, x, color, title, fontsize):
+    """
+    This function will plot a simple bar chart on the given axes.
+    """
+    data.plot(kind='bar', x=x, title=title, color=color, fontsize=fontsize, ax=ax)
+
+
+def retweet_favorite_chart(fig, data):
+    """ Scatter plot of favorite count against retweet count """
+    ax = fig.add_subplot()
+    sns.regplot(x='retweet_count', y='favorite_count', fit_reg=False,
+                data=data.astype('float64'), color='black', ax=ax)
+    ax.set_xlabel('Retweet Count', size=13)
+    ax.set_ylabel('Favorite Count', size=13)
+    ax.set_title('Relationship between Favorite Count and Retweet Count', size=13)
+
+
+def retweet_favorite_density_chart(fig, data):
+    """ Binned counts of favorite count against retweet count on log scales (see density_table) """
+    ax = fig.add_subplot()
+    x_edges = 10 ** np.append(data.index.to_numpy(), data.attrs['x_top'])
+    y_edges = 10 ** np.append(data.columns.to_numpy(), data.attrs['y_top'])
+    grid = data.to_numpy().T.astype('float64')
+    grid[grid == 0] = np.nan
+    mesh = ax.pcolormesh(x_edges, y_edges, grid, cmap='viridis', norm=LogNorm())
+    fig.colorbar(mesh, ax=ax, label='Tweets')
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('Retweet Count + 1', size=13)
+    ax.set_ylabel('Favorite Count + 1', size=13)
+    ax.set_title('Relationship between Favorite Count and Retweet Count', size=13)
+    ax.text(0.03, 0.97, 'Pearson r = {pearson:.2f}\nPearson r (log) = {pearson_log:.2f}\n'
+            'Spearman \u03c1 = {spearman:.2f}'.format(**data.attrs),
+            transform=ax.transAxes, va='top', fontsize=10,
+            bbox={'boxstyle': 'round', 'facecolor': 'white', 'alpha': 0.8})
+
+
+def weekday_chart(fig, data):
+    bar_chart(fig.add_subplot(), data, 'Day', 'royalblue', 'Tweet Count by Weekdays', 10)
+
+
+def year_month_chart(fig, data):
+    bar_chart(fig.add_subplot(), data, 'Year_Month', 'royalblue', 'Number of Tweets by Yearly-Month', 13)
+
+
+def stage_weekday_chart(fig, data):
+    """ Bars of the dog stage tweets for each day of the week """
+    ax = fig.add_subplot()
+    data = data.astype({'day_name': str, 'dog_stage': str})
+    sns.barplot(x='day_name', y='Count', hue='dog_stage', data=data, order=DAY_NAMES, ax=ax)
+    ax.set_xlabel('Weekdays', size=15)
+    ax.set_ylabel('Number of Tweets', size=15)
+    ax.set_title('Dog Stage Tweet by Weekdays', size=15)
+    ax.legend(loc=2, bbox_to_anchor=(1, 1))
+
+
+def dog_stage_chart(fig, data):
+    """ Ring chart of the share of tweets of each dog stage (see share_table) """
+    ax = fig.add_subplot()
+    ax.pie(data['count'], startangle=30, labeldistance=1.2,
+           counterclock=True, wedgeprops={'width': 0.4, 'linewidth': 1})
+    ax.set_title('Dog Stages', fontweight='bold', fontsize=15)
+    ax.legend(data['label'], bbox_to_anchor=(1, 0.8), bbox_transform=fig.transFigure, loc='center right')
+    ax.axis('equal')
+
+
+def source_chart(fig, data):
+    """ Pie chart of the share of tweets of each platform (see share_table) """
+    ax = fig.add_subplot()
+    ax.pie(data['count'], counterclock=False)
+    ax.set_title('Tweet Sources', fontweight='bold', fontsize=15)
+    ax.legend(data['label'], bbox_to_anchor=(1.1, 0.5), bbox_transform=fig.transFigure, loc='center right')
+    ax.axis('equal')
+
+
+# chart name -> (drawing function, figure size)
+CHARTS = {
+    'retweet_favorite': (retweet_favorite_chart, (6.4, 4.8)),
+    'retweet_favorite_density': (retweet_favorite_density_chart, (7.2, 4.8)),
+    'weekday_tweets': (weekday_chart, (6, 6)),
+    'year_month_tweets': (year_month_chart, (8, 4)),
+    'dog_stage_weekday': (stage_weekday_chart, (6.4, 4.8)),
+    'dog_stages': (dog_stage_chart, (6.4, 4.8)),
+    'tweet_sources': (source_chart, (6.4, 4.8)),
+}
+
+
+def chart_inputs(cube, retweet_favorite, density=None):
+    """
+    Data of every chart: the aggregate tables from the cube, and the retweet
+    and favorite counts of each tweet for the scatter plot. With ``density``
+    (by default when there are more than DENSITY_THRESHOLD tweets) the
+    scatter plot is replaced by the density chart of the binned counts.
+    """
+    if density is None:
+        density = len(retweet_favorite) > DENSITY_THRESHOLD
+    if density:
+        relationship = {'retweet_favorite_density': density_table(retweet_favorite)}
+    else:
+        relationship = {'retweet_favorite': retweet_favorite}
+    return {
+        **relationship,
+        'weekday_tweets': weekday_table(cube),
+        'year_month_tweets': year_month_table(cube),
+        'dog_stage_weekday': stage_weekday_table(cube),
+        'dog_stages': share_table(cube_counts(cube, 'dog_stage')),
+        'tweet_sources': share_table(cube_counts(cube, 'source')),
+    }
+
+
+def chart_figure(name, data, figure=Figure):
+    """
+    Draw a chart on a new figure made by ``figure``, which is a plain Agg
+    figure by default or e.g. ``plt.figure`` to show it in the notebook.
+    """
+    draw, figsize = CHARTS[name]
+    fig = figure(figsize=figsize)
+    draw(fig, data)
+    return fig
+
+
+def render_chart(name, data, out_dir, formats):
+    """ Render one chart headless and write it in each of the formats """
+    fig = chart_figure(name, data)
+    paths = []
+    for extension in formats:
+        path = os.path.join(out_dir, f'{name}.{extension}')
+        fig.savefig(path, bbox_inches='tight')
+        paths.append(path)
+    return paths
+
+
+def render_chart_profiled(name, data, out_dir, formats):
+    """ render_chart with a profiler, whose records go back to the parent process """
+    with Profiler() as profiler:
+        with step(name, rows_in=data) as record:
+            paths = render_chart(name, data, out_dir, formats)
+            # rows drawn
+            record['rows_out'] = row_count(data)
+    return paths, profiler.records, profiler.origin
+
+
+def chart_hash(name, data):
+    """ Hash of a chart's drawing code and input data """
+    digest = hashlib.sha256(inspect.getsource(CHARTS[name][0]).encode())
+    digest.update(repr(CHARTS[name][1]).encode())
+    digest.update(repr(getattr(data, 'attrs', {})).encode())
+    if isinstance(data, pd.DataFrame):
+        digest.update(repr(list(data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def render_charts(inputs, out_dir='charts', formats=('png', 'svg'), workers=None, skip_unchanged=True):
+    """
+    Render the charts of ``inputs`` (chart name -> data, see chart_inputs)
+    to files in ``out_dir`` on ``workers`` processes. With ``skip_unchanged``
+    a chart is only rendered again when its hash changed or a file is missing.
+
+    The manifest keeps the hash and files of each chart, and the legend
+    labels of the charts that have them, so the shares shown in the charts
+    can be read back without recomputing them.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+    hashes = {name: chart_hash(name, data) for name, data in inputs.items()}
+    todo = [name for name in inputs
+            if not skip_unchanged
+            or manifest.get(name, {}).get('hash') != hashes[name]
+            or not all(os.path.exists(os.path.join(out_dir, f'{name}.{extension}')) for extension in formats)]
+
+    profiler = active_profiler()
+    rows = [inputs[name] for name in todo]
+    with step('render charts', rows_in=rows) as record, ProcessPoolExecutor(max_workers=workers) as pool:
+        render = render_chart if profiler is None else render_chart_profiled
+        futures = {name: pool.submit(render, name, inputs[name], out_dir, formats) for name in todo}
+        for name, future in futures.items():
+            paths = future.result()
+            if profiler is not None:
+                paths, records, origin = paths
+                profiler.adopt(records, origin)
+            manifest[name] = {'hash': hashes[name], 'files': paths}
+            if isinstance(inputs[name], pd.DataFrame) and 'label' in inputs[name]:
+                manifest[name]['labels'] = inputs[name]['label'].tolist()
+        record['rows_out'] = row_count(rows)
+
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return {'rendered': todo, 'skipped': [name for name in inputs if name not in todo]}
@@ -0,0 +1,86 @@
+"""
+Chunked, out-of-core building of the master table.
+
+The archive csv is streamed in row chunks through the same cleaning steps
+as ``build_master``. The image prediction and API dataframes are small, so
+they are cleaned and indexed once and every chunk is joined to them and
+appended to the Parquet output. Only one chunk of the archive is in memory
+at a time, and with ``max_memory`` the chunk size is adjusted so the chunk,
+its cleaned copy and the lookups stay under the given number of bytes.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from wrangling.cleaning import STAGE_COLUMNS
+from wrangling.master import clean_images, clean_tweets
+from wrangling.merge import index_source
+from wrangling.schema import apply_schema
+from wrangling.storage import MASTER_PATH
+
+# text columns are read as strings even when a chunk holds only empty values
+ARCHIVE_DTYPES = {column: str for column in
+                  ['timestamp', 'source', 'text', 'expanded_urls', 'name', 'retweeted_status_timestamp']
+                  + STAGE_COLUMNS}
+
+MIN_CHUNK_ROWS = 1000
+
+
+def _writer_schema(table):
+    """
+    Schema of the first chunk with wide dictionary indices, so categoricals
+    of later chunks with more categories still fit.
+    """
+    fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type, field.type.ordered))
+              if pa.types.is_dictionary(field.type) else field for field in table.schema]
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def build_master_chunked(archive_path, images, api, path=MASTER_PATH, chunk_rows=100000,
+                         max_memory=None):
+    """
+    Build the master table from the archive csv at ``archive_path`` one chunk
+    of ``chunk_rows`` rows at a time and write it to ``path`` as Parquet.
+
+    ``max_memory`` is a ceiling in bytes for the data held at once. The first
+    chunk is kept small and the memory it takes per row sets the size of the
+    following chunks.
+    """
+    lookups = [index_source(clean_images(images), name='image'),
+               index_source(apply_schema(api), name='api')]
+    budget = None
+    if max_memory is not None:
+        budget = max_memory - sum(df.memory_usage(deep=True).sum() for df in lookups)
+        if budget <= 0:
+            raise ValueError(f"max_memory of {max_memory} bytes is smaller than the image and API lookups")
+        chunk_rows = min(chunk_rows, MIN_CHUNK_ROWS)
+
+    writer, schema = None, None
+    rows, chunks = 0, 0
+    with pd.read_csv(archive_path, dtype=ARCHIVE_DTYPES, iterator=True) as reader:
+        try:
+            while True:
+                try:
+                    chunk = reader.get_chunk(chunk_rows)
+                except StopIteration:
+                    break
+                master = clean_tweets(chunk).set_index('tweet_id').join(lookups, how='left')
+                master = apply_schema(master.reset_index()).drop(columns=STAGE_COLUMNS)
+
+                if writer is None:
+                    schema = _writer_schema(pa.Table.from_pandas(master, preserve_index=False))
+                    writer = pq.ParquetWriter(path, schema)
+                writer.write_table(pa.Table.from_pandas(master, schema=schema, preserve_index=False))
+                rows += len(master)
+                chunks += 1
+
+                if budget is not None:
+                    per_row = (chunk.memory_usage(deep=True).sum()
+                               + master.memory_usage(deep=True).sum()) / max(len(chunk), 1)
+                    chunk_rows = max(MIN_CHUNK_ROWS, int(budget / per_row))
+                del chunk, master
+        finally:
+            if writer is not None:
+                writer.close()
+    return {'rows': rows, 'chunks': chunks, 'chunk_rows': chunk_rows}
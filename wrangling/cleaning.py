@@ -0,0 +1,306 @@
+"""
+Declarative cleaning rules for the archive and image prediction dataframes.
+
+Each quality issue found during assessment is written down as an entry in a
+rule table. ``clean_frame`` compiles a table into as few vectorized
+operations as possible (a single dictionary based ``replace`` for all value
+substitutions, one categorical remap per label column) and applies them in
+one pass over the dataframe.
+"""
+
+import calendar
+import functools
+import html
+import re
+
+import numpy as np
+import pandas as pd
+
+from wrangling.profiling import step
+
+DAY_NAMES = list(calendar.day_name)
+MONTH_NAMES = list(calendar.month_name)[1:]
+
+# archive timestamps look like '2017-08-01 16:23:56 +0000'
+TIMESTAMP_WIDTH = 25
+UTC_SUFFIX = b' +0000'
+NAT_ORDINAL = np.iinfo(np.int64).min
+
+# a fraction such as 13/10 or 13.5/10 that is not part of a date like 11/15/15
+RATING_PATTERN = re.compile(r'(?<![\d/])(?P<numerator>\d+(?:\.\d+)?)/(?P<denominator>\d+)(?![\d/])')
+
+STAGE_COLUMNS = ['doggo', 'floofer', 'pupper', 'puppo']
+
+# when a tweet names more than one stage, the first one in this order is kept
+STAGE_PRIORITY = ['doggo', 'pupper', 'puppo', 'floofer']
+
+# the source column holds html anchors like <a href="http://vine.co" rel="nofollow">Vine - Make a Scene</a>
+SOURCE_ANCHOR = re.compile(r'<a\s[^>]*?href="(?P<url>[^"]*)"[^>]*>(?P<name>.*?)</a>', re.IGNORECASE | re.DOTALL)
+
+# short names kept for the clients of the original analysis, other clients
+# are named after the lower cased anchor text
+CLIENT_NAMES = {
+    'Twitter for iPhone': 'iphone',
+    'Vine - Make a Scene': 'vine',
+    'Twitter Web Client': 'twitter',
+    'TweetDeck': 'tweetdeck',
+}
+
+# rules for twitter-archive-enhanced.csv
+TWEET_RULES = {
+    # Issue #4: columns with over 2000 null values
+    'drop': ['in_reply_to_status_id', 'in_reply_to_user_id', 'retweeted_status_id',
+             'retweeted_status_user_id', 'retweeted_status_timestamp'],
+    # Issue #1: 'None' in the dog stage columns
+    'replace': {column: {'None': np.nan} for column in STAGE_COLUMNS},
+    # Issue #2: html in source
+    'sources': ['source'],
+    # Issue #3: timestamp is object instead of datetime
+    'to_datetime': ['timestamp'],
+    # Issue #5: tweet_id is kept as an int64 id, compact and quick to join on
+    'astype': {'tweet_id': 'int64'},
+}
+
+# rules for image-predictions.tsv
+IMAGE_RULES = {
+    # Issues #6, #7 and #8: mixed case and underscores in the predictions
+    'normalize': ['p1', 'p2', 'p3'],
+    # Issue #9: tweet_id is kept as an int64 id, compact and quick to join on
+    'astype': {'tweet_id': 'int64'},
+    # Issue #10: column names are not descriptive
+    'rename': {'jpg_url': 'image_url', 'img_num': 'image_number',
+               'p1': 'first_prediction', 'p1_conf': 'first_confidence', 'p1_dog': 'first_dog',
+               'p2': 'second_prediction', 'p2_conf': 'second_confidence', 'p2_dog': 'second_dog',
+               'p3': 'third_prediction', 'p3_conf': 'third_confidence', 'p3_dog': 'third_dog'},
+}
+
+
+def normalize_labels(series):
+    """
+    Replace underscores with spaces and lower case every value, working on
+    the distinct values only and returning a categorical column.
+    """
+    codes, uniques = pd.factorize(series)
+    cleaned = pd.Index(uniques, dtype=object).str.replace('_', ' ').str.lower()
+    # different raw labels can collapse into the same cleaned label
+    new_codes, categories = pd.factorize(cleaned)
+    codes = np.where(codes >= 0, new_codes[codes] if len(new_codes) else -1, -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+@functools.lru_cache(maxsize=None)
+def parse_source(anchor):
+    """
+    Client name and url of one source anchor. Text that is not an anchor is
+    taken as the client name, without url.
+    """
+    match = SOURCE_ANCHOR.search(anchor)
+    if match is None:
+        return anchor, None
+    name = html.unescape(match.group('name')).strip()
+    return CLIENT_NAMES.get(name, name.lower()), html.unescape(match.group('url'))
+
+
+def split_sources(series):
+    """
+    Client name and url of every source anchor, as two categorical columns.
+    Each distinct anchor is parsed once and the results are mapped back to
+    the rows through their codes.
+    """
+    codes, uniques = pd.factorize(series)
+    parsed = [parse_source(anchor) for anchor in uniques]
+    columns = {}
+    for position, column in enumerate(['name', 'url']):
+        new_codes, categories = pd.factorize(pd.Index([values[position] for values in parsed], dtype=object))
+        mapped = np.where(codes >= 0, new_codes[codes] if len(new_codes) else -1, -1)
+        columns[column] = pd.Categorical.from_codes(mapped, categories=categories)
+    return pd.DataFrame(columns, index=series.index)
+
+
+def clean_frame(df, rules):
+    """
+    Apply a rule table to a dataframe and return the cleaned dataframe.
+
+    Supported rules, applied in this order: ``drop`` (columns to remove),
+    ``replace`` (column -> {old value: new value}), ``sources`` (html
+    anchor columns for split_sources), ``to_datetime`` (columns to parse),
+    ``normalize`` (label columns for normalize_labels), ``astype``
+    (column -> dtype) and ``rename`` (old name -> new name).
+    Each kind of rule is recorded as a step of the active profiler.
+    """
+    with step('drop', rows_in=df) as record:
+        drop = set(rules.get('drop', []))
+        df = df[[column for column in df.columns if column not in drop]]
+        record['rows_out'] = len(df)
+
+    with step('replace', rows_in=df) as record:
+        replace = {column: mapping for column, mapping in rules.get('replace', {}).items()
+                   if column in df.columns}
+        if replace:
+            df = df.replace(replace)
+        else:
+            df = df.copy()
+        record['rows_out'] = len(df)
+
+    for column in rules.get('sources', []):
+        with step(f'sources:{column}', rows_in=df) as record:
+            parsed = split_sources(df[column])
+            df[column] = parsed['name']
+            df[column + '_url'] = parsed['url']
+            record['rows_out'] = len(df)
+    for column in rules.get('to_datetime', []):
+        with step(f'to_datetime:{column}', rows_in=df) as record:
+            df[column] = parse_timestamps(df[column])
+            record['rows_out'] = len(df)
+    for column in rules.get('normalize', []):
+        with step(f'normalize:{column}', rows_in=df) as record:
+            df[column] = normalize_labels(df[column])
+            record['rows_out'] = len(df)
+    if rules.get('astype'):
+        with step('astype', rows_in=df) as record:
+            df = df.astype(rules['astype'])
+            record['rows_out'] = len(df)
+    if rules.get('rename'):
+        with step('rename', rows_in=df) as record:
+            df = df.rename(columns=rules['rename'])
+            record['rows_out'] = len(df)
+    return df
+
+
+def _stage_lookup():
+    """
+    Code into STAGE_PRIORITY of the dog stage kept for each of the 16
+    combinations of stage flags, or -1 when no stage is set.
+    """
+    lookup = np.full(1 << len(STAGE_COLUMNS), -1, dtype=np.int8)
+    for mask in range(len(lookup)):
+        for code, stage in enumerate(STAGE_PRIORITY):
+            if mask & (1 << STAGE_COLUMNS.index(stage)):
+                lookup[mask] = code
+                break
+    return lookup
+
+
+STAGE_LOOKUP = _stage_lookup()
+
+
+def stage_mask(df):
+    """
+    Pack the doggo, floofer, pupper, and puppo columns into one small integer
+    per row, bit i being set when the tweet names STAGE_COLUMNS[i].
+    """
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for bit, column in enumerate(STAGE_COLUMNS):
+        mask |= df[column].eq(column).to_numpy(dtype=np.uint8) << bit
+    return pd.Series(mask, index=df.index, name='dog_stage_mask')
+
+
+def stage_names(mask):
+    """ Readable name of a stage combination, e.g. 'doggo+pupper' """
+    names = [stage for bit, stage in enumerate(STAGE_COLUMNS) if mask & (1 << bit)]
+    return '+'.join(names) if names else 'none'
+
+
+def resolve_dog_stage(mask):
+    """
+    Categorical dog stage of each row, looked up from its stage mask with
+    the STAGE_PRIORITY order.
+    """
+    codes = STAGE_LOOKUP[np.asarray(mask, dtype=np.intp)]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=STAGE_PRIORITY),
+                     index=getattr(mask, 'index', None), name='dog_stage')
+
+
+def parse_timestamps(values):
+    """
+    Parse archive timestamps laid out as '2017-08-01 16:23:56 +0000' into
+    UTC datetimes by slicing the fixed-width text, without inferring the
+    format per value. Values with any other layout are parsed by pandas.
+    """
+    values = pd.Series(values)
+    # non-ASCII characters are dropped, so values holding any fail the width check
+    encoded = values.str.encode('ascii', errors='ignore')
+    raw = encoded.to_numpy(dtype=object).astype(f'S{TIMESTAMP_WIDTH}')
+    chars = raw.view('S1').reshape(len(raw), TIMESTAMP_WIDTH)
+    fixed = (((values.str.len() == TIMESTAMP_WIDTH) & (encoded.str.len() == TIMESTAMP_WIDTH)).to_numpy(dtype=bool)
+             & (chars[:, 4] == b'-') & (chars[:, 7] == b'-') & (chars[:, 10] == b' ')
+             & (chars[:, 13] == b':') & (chars[:, 16] == b':')
+             & np.all(chars[:, 19:] == np.frombuffer(UTC_SUFFIX, dtype='S1'), axis=1))
+
+    parsed = np.full(len(raw), np.datetime64('NaT'), dtype='datetime64[s]')
+    iso = chars[fixed, :19].copy()
+    iso[:, 10] = b'T'
+    parsed[fixed] = iso.view('S19').ravel().astype('datetime64[s]')
+    # microsecond resolution, which Parquet stores as it is
+    result = pd.Series(parsed.astype('datetime64[us]'), index=values.index,
+                       name=values.name).dt.tz_localize('UTC')
+
+    other = ~fixed & values.notna().to_numpy()
+    if other.any():
+        result[other] = pd.to_datetime(values[other], utc=True, format='mixed').astype(result.dtype)
+    return result
+
+
+def add_calendar_columns(df, column='timestamp'):
+    """
+    Add day_name, month, and year_month columns derived from the timestamp.
+    The weekday and month of each row are computed from the integer value of
+    the timestamp and looked up in small tables of names, so no text is
+    formatted per row.
+    """
+    timestamp = df[column]
+    missing = timestamp.isna().to_numpy()
+    seconds = timestamp.dt.tz_convert('UTC').dt.tz_localize(None).to_numpy().astype('datetime64[s]')
+    days = seconds.astype('datetime64[D]').astype(np.int64)
+    months = seconds.astype('datetime64[M]').astype(np.int64)
+
+    # 1970-01-01 was a Thursday, weekday 3 counting from Monday
+    weekday = np.where(missing, -1, (days + 3) % 7)
+    month = np.where(missing, -1, months % 12)
+    df['day_name'] = pd.Categorical.from_codes(weekday, dtype=pd.CategoricalDtype(DAY_NAMES, ordered=True))
+    df['month'] = pd.Categorical.from_codes(month, dtype=pd.CategoricalDtype(MONTH_NAMES, ordered=True))
+    df['year_month'] = pd.PeriodIndex.from_ordinals(np.where(missing, NAT_ORDINAL, months), freq='M')
+    return df
+
+
+def extract_ratings(text):
+    """
+    Extract the rating of each tweet from its text with one compiled pattern
+    run over the whole column.
+
+    When a text holds several fractions (dates like 24/7, 9/11, several
+    dogs), the rating kept is the first fraction over 10, else the first
+    fraction over a multiple of 10 (ratings of groups, such as 88/80), else
+    the first fraction. Returns the numerator (decimals kept), denominator
+    and the number of fractions found for every row.
+    """
+    found = text.str.extractall(RATING_PATTERN)
+    found = found.astype({'numerator': 'float64', 'denominator': 'int64'})
+    denominator = found['denominator'].to_numpy()
+    found['rank'] = np.select([denominator == 10, (denominator > 0) & (denominator % 10 == 0)], [0, 1], 2)
+
+    found.index.names = ['row', 'match']
+    found = found.reset_index()
+    counts = found['row'].value_counts()
+    chosen = found.sort_values(['row', 'rank', 'match']).drop_duplicates('row').set_index('row')
+
+    ratings = pd.DataFrame(index=text.index)
+    ratings['text_rating_numerator'] = chosen['numerator'].reindex(text.index)
+    ratings['text_rating_denominator'] = chosen['denominator'].reindex(text.index)
+    ratings['rating_candidates'] = counts.reindex(text.index, fill_value=0).to_numpy()
+    return ratings.astype({'text_rating_numerator': 'Float32', 'text_rating_denominator': 'Int32',
+                           'rating_candidates': 'uint8'})
+
+
+def add_ratings(df):
+    """
+    Add the ratings extracted from the text and a rating_mismatch flag for
+    tweets whose rating_numerator or rating_denominator disagree with them.
+    """
+    ratings = extract_ratings(df['text'])
+    for column in ratings.columns:
+        df[column] = ratings[column]
+    mismatch = ((df['rating_numerator'].astype('Float64') != df['text_rating_numerator'].astype('Float64'))
+                | (df['rating_denominator'].astype('Int64') != df['text_rating_denominator'].astype('Int64')))
+    df['rating_mismatch'] = mismatch.fillna(True).astype('boolean')
+    return df
@@ -0,0 +1,73 @@
+"""
+Aggregate cube behind the insights and charts.
+
+The master table is reduced once to tweet counts and retweet / favorite
+sums for every combination of year_month, day_name, dog_stage and source.
+The cube holds a few hundred rows whatever the size of the archive, so the
+insight queries read it instead of the master table, and an incremental
+refresh only adds the rows that came in and subtracts the ones that left.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+CUBE_PATH = 'twitter_archive_master.cube.parquet'
+
+CUBE_DIMENSIONS = ['year_month', 'day_name', 'dog_stage', 'source']
+CUBE_MEASURES = ['retweet_count', 'favorite_count']
+CUBE_COLUMNS = CUBE_DIMENSIONS + CUBE_MEASURES
+
+
+def build_cube(master):
+    """ Tweet count and retweet / favorite sums for each combination of dimensions """
+    grouped = master[CUBE_COLUMNS].groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+    cube = grouped[CUBE_MEASURES].sum()
+    cube.insert(0, 'tweets', grouped.size())
+    return cube.astype('int64').reset_index()
+
+
+def update_cube(cube, added=None, removed=None):
+    """
+    Return the cube with the rows of ``added`` counted in and the rows of
+    ``removed`` taken out, without going back to the master table.
+    """
+    parts = [cube]
+    if added is not None and len(added):
+        parts.append(build_cube(added))
+    if removed is not None and len(removed):
+        removed = build_cube(removed)
+        removed[['tweets'] + CUBE_MEASURES] *= -1
+        parts.append(removed)
+    combined = pd.concat(parts, ignore_index=True)
+    # categories of the parts can differ, so they are aligned before grouping
+    for column in CUBE_DIMENSIONS:
+        if isinstance(cube[column].dtype, pd.CategoricalDtype):
+            categories = pd.unique(np.concatenate(
+                [part[column].astype('category').cat.categories.to_numpy(dtype=object) for part in parts]))
+            combined[column] = pd.Categorical(combined[column], categories=categories,
+                                              ordered=cube[column].dtype.ordered)
+    cube = combined.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).sum()
+    return cube[cube['tweets'] != 0].reset_index()
+
+
+def save_cube(cube, path=CUBE_PATH):
+    cube.to_parquet(path, index=False)
+    return path
+
+
+def load_cube(path=CUBE_PATH):
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def cube_counts(cube, by, measure='tweets', sort=True):
+    """
+    Total of ``measure`` for each value of the dimension(s) ``by``, leaving
+    out missing values and sorted from largest like ``value_counts``.
+    """
+    counts = cube.groupby(by, observed=True)[measure].sum()
+    counts = counts[counts != 0]
+    return counts.sort_values(ascending=False, kind='stable') if sort else counts
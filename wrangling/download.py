@@ -0,0 +1,88 @@
+"""
+Content-addressed HTTP cache for programmatic downloads.
+
+Files are streamed to disk in chunks while being hashed and stored under
+their SHA-256 digest, so the same content is only ever kept once. The cache
+index remembers each URL's ETag and Last-Modified headers, and later calls
+revalidate with If-None-Match / If-Modified-Since instead of downloading the
+file again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import requests
+
+INDEX_NAME = 'index.json'
+OBJECTS_DIR = 'objects'
+CHUNK_SIZE = 1 << 16
+
+
+def _load_index(cache_dir):
+    path = os.path.join(cache_dir, INDEX_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def _save_index(cache_dir, index):
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(index, file, indent=2)
+    os.replace(tmp_path, os.path.join(cache_dir, INDEX_NAME))
+
+
+def cached_download(url, cache_dir='banji', session=None, timeout=60, chunk_size=CHUNK_SIZE):
+    """
+    Return the local path of the cached copy of ``url``, downloading it only
+    when the server reports that it changed since the last call.
+    """
+    session = session or requests
+    objects_dir = os.path.join(cache_dir, OBJECTS_DIR)
+    os.makedirs(objects_dir, exist_ok=True)
+
+    index = _load_index(cache_dir)
+    entry = index.get(url)
+    cached_path = entry and os.path.join(objects_dir, entry['object'])
+
+    headers = {}
+    if entry and os.path.exists(cached_path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return cached_path
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    digest.update(chunk)
+                    file.write(chunk)
+            extension = os.path.splitext(url.split('?')[0])[1]
+            object_name = digest.hexdigest() + extension
+            object_path = os.path.join(objects_dir, object_name)
+            if os.path.exists(object_path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, object_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        index[url] = {
+            'object': object_name,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+    _save_index(cache_dir, index)
+    return object_path
@@ -0,0 +1,184 @@
+"""
+Batched, concurrent gathering of tweets from the Twitter API.
+
+Instead of calling ``api.get_status`` once per tweet id, ids are sent to the
+``statuses/lookup`` endpoint in batches of 100 and several batches run at
+once on a bounded thread pool. A shared rate limiter keeps the whole pool
+inside the endpoint's request budget, and failed batches are retried with
+exponential backoff.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from wrangling.json_backend import loads
+
+API_BASE_URL = 'https://api.twitter.com/1.1'
+
+# statuses/lookup accepts at most 100 ids per request
+LOOKUP_BATCH_SIZE = 100
+
+# statuses/lookup allows 900 requests per 15 minute window with user auth
+RATE_LIMIT_REQUESTS = 900
+RATE_LIMIT_WINDOW = 15 * 60
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TransientError(Exception):
+    """
+    Raised for failures that are worth retrying (connection problems,
+    rate limiting and 5xx responses).
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Thread safe limiter shared by all gathering workers.
+
+    It spaces requests so that no more than ``max_requests`` are sent per
+    ``window`` seconds, and it pauses every worker when the server reports
+    that the budget is used up through its ``x-rate-limit-*`` headers.
+    """
+
+    def __init__(self, max_requests=RATE_LIMIT_REQUESTS, window=RATE_LIMIT_WINDOW,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.interval = window / max_requests
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = clock()
+        self._blocked_until = 0.0
+
+    def acquire(self):
+        """ Block until the next request may be sent """
+        with self._lock:
+            now = self.clock()
+            slot = max(self._next_slot, self._blocked_until, now)
+            self._next_slot = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            self.sleep(delay)
+
+    def block_for(self, seconds):
+        """ Hold back every worker for the given number of seconds """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self.clock() + seconds)
+
+    def update(self, headers):
+        """ Read the rate limit headers of a response """
+        remaining = headers.get('x-rate-limit-remaining')
+        reset = headers.get('x-rate-limit-reset')
+        if remaining is None or reset is None:
+            return
+        if int(remaining) <= 0:
+            self.block_for(max(0.0, float(reset) - time.time()))
+
+
+def batches(ids, size=LOOKUP_BATCH_SIZE):
+    """ Split a sequence of tweet ids into lists of at most ``size`` ids """
+    ids = list(ids)
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def lookup_batch(session, ids, base_url=API_BASE_URL, limiter=None, timeout=30):
+    """
+    Fetch one batch of tweets through ``statuses/lookup``.
+
+    Returns a dictionary mapping every requested id to its tweet JSON, or to
+    None when the tweet no longer exists. Raises TransientError for failures
+    that should be retried and requests.HTTPError for the others.
+    """
+    if limiter is not None:
+        limiter.acquire()
+    params = {'id': ','.join(str(i) for i in ids), 'tweet_mode': 'extended',
+              'map': 'true', 'include_entities': 'true'}
+    try:
+        response = session.get(base_url.rstrip('/') + '/statuses/lookup.json',
+                               params=params, timeout=timeout)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise TransientError(str(e))
+
+    if limiter is not None:
+        limiter.update(response.headers)
+    if response.status_code in RETRY_STATUS_CODES:
+        retry_after = response.headers.get('retry-after')
+        if retry_after is None and response.status_code == 429:
+            reset = response.headers.get('x-rate-limit-reset')
+            if reset is not None:
+                retry_after = max(0.0, float(reset) - time.time())
+        raise TransientError(f'HTTP {response.status_code}',
+                             retry_after=None if retry_after is None else float(retry_after))
+    response.raise_for_status()
+
+    # with map=true the response is {"id": {id_str: tweet or null}}
+    found = loads(response.content)['id']
+    return {int(i): found.get(str(i)) for i in ids}
+
+
+def gather_tweets(ids, session, base_url=API_BASE_URL, batch_size=LOOKUP_BATCH_SIZE,
+                  max_workers=4, max_retries=5, backoff=1.0, limiter=None,
+                  on_batch=None, sleep=time.sleep):
+    """
+    Gather tweets for the given ids with several lookup batches in flight.
+
+    ``on_batch(found, missing)`` is called from the caller's thread as each
+    batch completes, with the list of tweet JSON objects and the list of ids
+    that no longer exist, so results can be written out as they arrive.
+
+    Returns a dictionary with the gathered ``tweets``, the ``deleted`` ids,
+    the ``failed`` ids with their error, and the throughput in ``ids_per_second``.
+    """
+    if limiter is None:
+        limiter = RateLimiter()
+
+    def run(batch):
+        for attempt in range(max_retries + 1):
+            try:
+                return lookup_batch(session, batch, base_url=base_url, limiter=limiter)
+            except TransientError as e:
+                if attempt == max_retries:
+                    raise
+                delay = backoff * 2 ** attempt * (1 + random.random())
+                if e.retry_after is not None:
+                    delay = max(delay, e.retry_after)
+                    limiter.block_for(e.retry_after)
+                sleep(delay)
+
+    tweets, deleted, failed = [], [], {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, batch): batch for batch in batches(ids, batch_size)}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                for tweet_id in batch:
+                    failed[int(tweet_id)] = str(e)
+                print(f"Error - batch of {len(batch)} ids starting at {batch[0]}: {e}")
+                continue
+            found = [tweet for tweet in result.values() if tweet is not None]
+            missing = [tweet_id for tweet_id, tweet in result.items() if tweet is None]
+            tweets.extend(found)
+            deleted.extend(missing)
+            if on_batch is not None:
+                on_batch(found, missing)
+    elapsed = time.perf_counter() - start
+
+    total = len(tweets) + len(deleted) + len(failed)
+    return {
+        'tweets': tweets,
+        'deleted': deleted,
+        'failed': failed,
+        'elapsed': elapsed,
+        'ids_per_second': total / elapsed if elapsed > 0 else float('inf'),
+    }
@@ -0,0 +1,43 @@
+"""
+JSON encoding and decoding of tweets with the fastest library available.
+
+orjson is used when it is installed and the standard library ``json``
+module otherwise. The environment variable ``WRANGLING_JSON_BACKEND``
+(``orjson`` or ``stdlib``) picks one explicitly, and ``get_backend`` returns
+the functions of any available backend, e.g. to compare them. The decoders
+of both backends accept str and bytes and raise a ValueError on malformed
+input, and ``dumps`` returns one line of text, so callers do not depend on
+the backend in use.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _orjson_dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+# backend name -> (loads, dumps)
+BACKENDS = {'stdlib': (json.loads, json.dumps)}
+if orjson is not None:
+    BACKENDS['orjson'] = (orjson.loads, _orjson_dumps)
+
+
+def get_backend(name=None):
+    """
+    Name, ``loads`` and ``dumps`` of the backend ``name``, of the one set in
+    WRANGLING_JSON_BACKEND, or of the fastest one installed.
+    """
+    name = name or os.environ.get('WRANGLING_JSON_BACKEND') or ('orjson' if orjson is not None else 'stdlib')
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend {name!r} is not available, choose from {sorted(BACKENDS)}")
+    return (name, *BACKENDS[name])
+
+
+BACKEND, loads, dumps = get_backend()
@@ -0,0 +1,83 @@
+"""
+Checkpoint ledger for resumable tweet gathering.
+
+The ledger is a small SQLite table recording, for every tweet id, whether it
+was fetched, failed or found deleted. ``tweet_json.txt`` is only ever
+appended to, so a gathering run that stops partway can be restarted and will
+request only the ids that are still missing.
+"""
+
+import sqlite3
+import time
+
+FETCHED = 'fetched'
+FAILED = 'failed'
+DELETED = 'deleted'
+
+
+class TweetLedger:
+    """
+    Record of the gathering status of each tweet id, stored in SQLite.
+    """
+
+    def __init__(self, path='tweet_json.ledger.sqlite'):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS tweets (
+                tweet_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def _record(self, rows):
+        """ Record ``(tweet_id, status, error)`` rows, counting an attempt for each """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO tweets (tweet_id, status, error, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(tweet_id) DO UPDATE SET
+                    status = excluded.status,
+                    error = excluded.error,
+                    attempts = attempts + 1,
+                    updated_at = excluded.updated_at
+            """, [(int(i), status, error, now) for i, status, error in rows])
+
+    def mark(self, ids, status, error=None):
+        """ Record the same status for every id in ``ids`` """
+        self._record((i, status, error) for i in ids)
+
+    def mark_failed(self, failed):
+        """ Record failures from a dictionary mapping ids to their error """
+        self._record((i, FAILED, error) for i, error in failed.items())
+
+    def pending(self, ids, retry_failed=True, max_attempts=None):
+        """
+        Return the ids that still need to be requested, in their original
+        order. Fetched and deleted ids are always skipped; failed ids are
+        retried unless ``retry_failed`` is False or they reached ``max_attempts``.
+        """
+        done = {tweet_id for tweet_id, status, attempts in self.conn.execute(
+                    'SELECT tweet_id, status, attempts FROM tweets')
+                if status in (FETCHED, DELETED)
+                or (status == FAILED and (not retry_failed
+                                          or (max_attempts is not None and attempts >= max_attempts)))}
+        return [i for i in ids if int(i) not in done]
+
+    def counts(self):
+        """ Number of ids recorded under each status """
+        return dict(self.conn.execute('SELECT status, COUNT(*) FROM tweets GROUP BY status'))
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
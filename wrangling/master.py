@@ -0,0 +1,153 @@
+"""
+Building and incrementally refreshing the twitter_archive_master table.
+
+``build_master`` runs every cleaning step of the notebook on the three raw
+dataframes. ``refresh_master`` keeps a hash of every raw row of each source
+next to the stored master table, so a later run only cleans and merges the
+tweets that are new or changed in any source and upserts them into the
+stored table instead of rebuilding it from scratch.
+"""
+
+import os
+
+import pandas as pd
+
+from wrangling.cleaning import (IMAGE_RULES, STAGE_COLUMNS, TWEET_RULES, add_calendar_columns,
+                                add_ratings, clean_frame, resolve_dog_stage, stage_mask)
+from wrangling.cube import CUBE_COLUMNS, build_cube, load_cube, save_cube, update_cube
+from wrangling.merge import join_sources
+from wrangling.parallel import parallel_clean
+from wrangling.profiling import step
+from wrangling.schema import apply_schema
+from wrangling.storage import MASTER_PATH, load_master, upsert_master
+
+SOURCES = ['archive', 'image', 'api']
+
+
+def clean_tweets(tweets):
+    """
+    Cleaning steps of the archive dataframe that work row by row, so they can
+    be applied to the whole archive or to any chunk of it.
+    """
+    with step('tweet rules', rows_in=tweets) as record:
+        twt_clean_df = apply_schema(clean_frame(tweets, TWEET_RULES))
+        record['rows_out'] = len(twt_clean_df)
+    with step('ratings', rows_in=twt_clean_df) as record:
+        twt_clean_df = add_ratings(twt_clean_df)
+        record['rows_out'] = len(twt_clean_df)
+    with step('dog stage', rows_in=twt_clean_df) as record:
+        twt_clean_df['dog_stage_mask'] = stage_mask(twt_clean_df)
+        twt_clean_df['dog_stage'] = resolve_dog_stage(twt_clean_df['dog_stage_mask'])
+        record['rows_out'] = len(twt_clean_df)
+    with step('calendar', rows_in=twt_clean_df) as record:
+        twt_clean_df = add_calendar_columns(twt_clean_df)
+        record['rows_out'] = len(twt_clean_df)
+    return twt_clean_df
+
+
+def clean_images(images):
+    """ Cleaning steps of the image prediction dataframe """
+    with step('image rules', rows_in=images) as record:
+        image_clean_df = apply_schema(clean_frame(images, IMAGE_RULES))
+        record['rows_out'] = len(image_clean_df)
+    return image_clean_df
+
+
+def build_master(tweets, images, api, workers=1):
+    """
+    Clean the raw archive, image prediction and API dataframes and join them
+    into the master table, as done step by step in the notebook. With
+    ``workers`` above 1 the cleaning runs on row partitions in that many
+    processes.
+    """
+    with step('clean', rows_in=[tweets, images]) as record:
+        if workers > 1:
+            twt_clean_df = parallel_clean(tweets, clean_tweets, workers=workers)
+            image_clean_df = parallel_clean(images, clean_images, workers=workers)
+        else:
+            twt_clean_df, image_clean_df = clean_tweets(tweets), clean_images(images)
+        record['rows_out'] = len(twt_clean_df) + len(image_clean_df)
+    with step('merge', rows_in=[twt_clean_df, image_clean_df, api]) as record:
+        merged_df, _ = join_sources(twt_clean_df, {'image': image_clean_df, 'api': apply_schema(api)})
+        master = apply_schema(merged_df).drop(columns=STAGE_COLUMNS)
+        record['rows_out'] = len(master)
+    return master
+
+
+def state_path(path=MASTER_PATH):
+    """ Location of the row hashes kept next to the stored master table """
+    return os.path.splitext(path)[0] + '.state.parquet'
+
+
+def cube_path(path=MASTER_PATH):
+    """ Location of the aggregate cube kept next to the stored master table """
+    return os.path.splitext(path)[0] + '.cube.parquet'
+
+
+def row_hashes(tweets, images, api, key='tweet_id'):
+    """
+    One 64 bit content hash per tweet_id and source. Ids missing from a
+    source get a hash of 0.
+    """
+    hashes = []
+    for name, df in zip(SOURCES, (tweets, images, api)):
+        df = df.drop_duplicates(key, keep='last')
+        values = pd.util.hash_pandas_object(df.drop(columns=key), index=False).to_numpy()
+        hashes.append(pd.Series(values, index=pd.Index(df[key].astype('int64'), name=key), name=name))
+    # reindexed while still uint64, since missing values would round the hashes through float64
+    ids = hashes[0].index.union(hashes[1].index).union(hashes[2].index)
+    return pd.concat([series.reindex(ids, fill_value=0) for series in hashes], axis=1)
+
+
+def write_state(tweets, images, api, path=MASTER_PATH):
+    """ Record the row hashes of the sources the stored master was built from """
+    row_hashes(tweets, images, api).reset_index().to_parquet(state_path(path), index=False)
+
+
+def changed_ids(tweets, images, api, path=MASTER_PATH):
+    """
+    Tweet ids of the archive that are new or changed in any source since the
+    last build, and ids that are no longer in the archive.
+    """
+    current = row_hashes(tweets, images, api)
+    current = current[current['archive'] != 0]
+    if not os.path.exists(state_path(path)):
+        return current.index, pd.Index([], dtype='int64')
+    stored = pd.read_parquet(state_path(path)).set_index('tweet_id')
+    stored = stored[stored['archive'] != 0]
+
+    aligned = stored.reindex(current.index, fill_value=0)
+    changed = current.index[(aligned != current).any(axis=1).to_numpy()]
+    removed = stored.index.difference(current.index)
+    return changed, removed
+
+
+def refresh_master(tweets, images, api, path=MASTER_PATH, partition_by=None, workers=1):
+    """
+    Clean, merge and upsert only the tweets that are new or changed since the
+    stored master was built, remove tweets gone from the archive, and return
+    the number of tweets refreshed and removed. The aggregate cube is updated
+    with the same rows.
+    """
+    changed, removed = changed_ids(tweets, images, api, path)
+    cube = load_cube(cube_path(path))
+    if len(changed) or len(removed):
+        rows = build_master(tweets[tweets.tweet_id.isin(changed)],
+                            images[images.tweet_id.isin(changed)],
+                            api[api.tweet_id.isin(changed)], workers=workers)
+        if not os.path.exists(path):
+            # a cube without its master table cannot be updated, it is built again below
+            cube = None
+        if cube is not None:
+            stored = load_master(path, columns=['tweet_id'] + CUBE_COLUMNS)
+            old_rows = stored[stored.tweet_id.isin(changed.union(removed))]
+        upsert_master(rows, path, remove_ids=removed, partition_by=partition_by)
+        if cube is not None:
+            cube = update_cube(cube, added=rows, removed=old_rows)
+        else:
+            cube = build_cube(load_master(path, columns=CUBE_COLUMNS))
+        save_cube(cube, cube_path(path))
+    elif cube is None and os.path.exists(path):
+        save_cube(build_cube(load_master(path, columns=CUBE_COLUMNS)), cube_path(path))
+    write_state(tweets, images, api, path)
+    return {'refreshed': len(changed), 'removed': len(removed)}
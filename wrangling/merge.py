@@ -0,0 +1,47 @@
+"""
+Single-step join of the archive, image prediction and API dataframes.
+
+Every source is indexed on its int64 tweet_id once and the image and API
+frames are aligned to the archive with one multi-way index join, instead of
+two nested merges that hash the keys twice and build an intermediate frame.
+"""
+
+import pandas as pd
+
+
+def index_source(df, key='tweet_id', name='source'):
+    """ Index a source on its key, keeping the last row of duplicated ids """
+    df = df.set_index(key)
+    if not df.index.is_unique:
+        duplicated = df.index.duplicated(keep='last')
+        print(f"{name}: dropping {duplicated.sum()} rows with duplicated {key}")
+        df = df[~duplicated]
+    return df
+
+
+def join_sources(archive, others, key='tweet_id'):
+    """
+    Left join every dataframe of ``others`` (a dictionary of name ->
+    dataframe) to ``archive`` on ``key`` in a single index join.
+
+    Returns the joined dataframe, with ``key`` as an ordinary column again,
+    and a report of how many of each source's rows matched the archive,
+    how many are orphans with no archive row, and how many archive rows
+    have no row in that source.
+    """
+    base = archive.set_index(key)
+    indexed = {name: index_source(df, key, name) for name, df in others.items()}
+
+    report = []
+    for name, df in indexed.items():
+        matched = df.index.isin(base.index)
+        report.append({
+            'source': name,
+            'rows': len(df),
+            'matched': int(matched.sum()),
+            'orphans': int((~matched).sum()),
+            'archive_rows_missing': int((~base.index.isin(df.index)).sum()),
+        })
+
+    joined = base.join(list(indexed.values()), how='left')
+    return joined.reset_index(), pd.DataFrame(report).set_index('source')
@@ -0,0 +1,99 @@
+"""
+Parallel cleaning of dataframes across processes.
+
+The dataframe is split into contiguous row partitions and a cleaning
+function that works row by row (such as ``master.clean_tweets``) runs on
+each partition in a pool of worker processes. Each worker writes its result
+as an Arrow IPC stream into a shared memory block, so the cleaned columns
+reach the parent process without being pickled, and the partitions are
+concatenated back in their original order.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from wrangling.schema import apply_schema
+
+
+def _write_stream(table, buffer):
+    """ Write ``table`` as an Arrow IPC stream into a writable buffer """
+    sink = pa.FixedSizeBufferWriter(pa.py_buffer(buffer))
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.close()
+
+
+def _clean_partition(func, partition):
+    """ Run ``func`` in a worker and leave the result in shared memory """
+    table = pa.Table.from_pandas(func(partition), preserve_index=False)
+    mock = pa.MockOutputStream()
+    with pa.ipc.new_stream(mock, table.schema) as writer:
+        writer.write_table(table)
+    size = mock.size()
+
+    # the stream is written straight into the shared block instead of being pickled
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    _write_stream(table, shm.buf)
+    shm.close()
+    # the parent process frees the block, not the worker's exit
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm.name, size
+
+
+def _collect(name, size):
+    """ Read a worker's result out of shared memory and free the block """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # one flat copy, so the dataframe does not point into the block freed below
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+    with pa.ipc.open_stream(data) as reader:
+        return reader.read_pandas()
+
+
+def _free(name):
+    """ Free the shared memory block of a result that will not be collected """
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def parallel_clean(df, func, workers=None, partitions=None):
+    """
+    Apply ``func`` to row partitions of ``df`` on ``workers`` processes (all
+    cores by default) and return the results concatenated in order.
+
+    ``func`` must be importable at module level so it can be sent to the
+    workers, and must not depend on rows outside its partition.
+    """
+    workers = workers or os.cpu_count()
+    partitions = partitions or workers
+    if workers <= 1 or len(df) < partitions:
+        return func(df)
+
+    bounds = np.linspace(0, len(df), partitions + 1, dtype=int)
+    parts = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+    frames = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_clean_partition, func, part) for part in parts]
+        try:
+            for future in futures:
+                frames.append(_collect(*future.result()))
+        finally:
+            # when a partition fails, the blocks of the partitions that finished are freed
+            for future in futures[len(frames):]:
+                if not future.cancel() and future.exception() is None:
+                    _free(future.result()[0])
+
+    # categoricals of different partitions hold different categories
+    return apply_schema(pd.concat(frames, ignore_index=True))
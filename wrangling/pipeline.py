@@ -0,0 +1,211 @@
+"""
+Named pipeline stages with on-disk memoization of their outputs.
+
+Each stage declares the stages it reads, the files it reads and the modules
+its code depends on. The key of a stage hashes its code, its parameters, the
+size and modification time of its files and the keys of its input stages, so
+it changes whenever anything upstream of the stage changes. Outputs are
+pickled under their key in the cache directory, and ``run`` only computes
+the stages whose current key has no stored output, or that write files
+which are missing. Stages upstream of a cached stage are not even loaded,
+so changing a chart reruns the chart stages alone.
+"""
+
+import hashlib
+import inspect
+import os
+import pickle
+
+import pandas as pd
+
+from wrangling import charts, cleaning, cube, merge, schema, tweet_json
+from wrangling import master as master_module
+from wrangling.charts import chart_inputs, render_charts
+from wrangling.cube import build_cube, save_cube
+from wrangling.master import build_master, cube_path, state_path, write_state
+from wrangling.profiling import row_count, step
+from wrangling.storage import MASTER_PATH, save_master
+from wrangling.tweet_json import read_tweet_json
+
+CACHE_DIR = '.pipeline'
+
+
+class Pipeline:
+    """
+    Stages added in dependency order and run on demand with
+    ``pipeline.run(targets)``.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), files=(), code=(), params=None, cache=True, forced=None, writes=()):
+        """
+        Add stage ``name`` computing ``func(*outputs of inputs, **params)``.
+
+        ``files`` are the paths the stage reads and ``code`` the modules whose
+        source is part of its key besides ``func`` itself. ``writes`` are the
+        files the stage writes, and a cached stage is computed again when
+        any of them is missing. A stage with ``cache=False`` runs every time
+        it is needed.
+        ``forced`` are parameters added when the stage is forced, for stages
+        that skip unchanged work of their own.
+        """
+        if name in self.stages:
+            raise ValueError(f"stage {name!r} is already defined")
+        unknown = [stage for stage in inputs if stage not in self.stages]
+        if unknown:
+            raise ValueError(f"stage {name!r} reads undefined stages {unknown}")
+        self.stages[name] = {'func': func, 'inputs': list(inputs), 'files': list(files),
+                             'code': list(code), 'params': params or {}, 'cache': cache,
+                             'forced': forced or {}, 'writes': list(writes)}
+        return self
+
+    def key(self, name, keys=None):
+        """ Hash of the code, parameters and files of a stage and of the keys of its inputs """
+        keys = {} if keys is None else keys
+        if name not in keys:
+            stage = self.stages[name]
+            digest = hashlib.sha256(name.encode())
+            digest.update(inspect.getsource(stage['func']).encode())
+            for module in stage['code']:
+                digest.update(inspect.getsource(module).encode())
+            digest.update(repr(sorted(stage['params'].items())).encode())
+            for path in stage['files']:
+                stat = os.stat(path)
+                digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+            for upstream in stage['inputs']:
+                digest.update(self.key(upstream, keys).encode())
+            keys[name] = digest.hexdigest()
+        return keys[name]
+
+    def path(self, name, key):
+        return os.path.join(self.cache_dir, f'{name}-{key[:16]}.pkl')
+
+    def _store(self, name, key, output):
+        """ Pickle the output of a stage under its key and drop its older outputs """
+        path = self.path(name, key)
+        with open(path + '.tmp', 'wb') as file:
+            pickle.dump(output, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + '.tmp', path)
+        for entry in os.listdir(self.cache_dir):
+            if entry.startswith(name + '-') and entry.endswith('.pkl') \
+                    and os.path.join(self.cache_dir, entry) != path:
+                os.remove(os.path.join(self.cache_dir, entry))
+
+    def run(self, targets=None, force=()):
+        """
+        Return the outputs of the ``targets`` stages (the stages no other stage
+        reads by default) and a report of the stages that were computed and
+        the ones loaded from the cache. Stages in ``force`` are computed, with
+        their ``forced`` parameters, even when their output is cached.
+        Computed stages are recorded as steps of the active profiler.
+        """
+        if targets is None:
+            read = {upstream for stage in self.stages.values() for upstream in stage['inputs']}
+            targets = [name for name in self.stages if name not in read]
+        elif isinstance(targets, str):
+            targets = [targets]
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        keys, outputs = {}, {}
+        report = {'computed': [], 'loaded': []}
+
+        def resolve(name):
+            if name in outputs:
+                return outputs[name]
+            stage = self.stages[name]
+            path = self.path(name, self.key(name, keys))
+            if stage['cache'] and name not in force and os.path.exists(path) \
+                    and all(os.path.exists(written) for written in stage['writes']):
+                with open(path, 'rb') as file:
+                    outputs[name] = pickle.load(file)
+                report['loaded'].append(name)
+            else:
+                arguments = [resolve(upstream) for upstream in stage['inputs']]
+                params = {**stage['params'], **stage['forced']} if name in force else stage['params']
+                with step(name, rows_in=arguments) as record:
+                    outputs[name] = stage['func'](*arguments, **params)
+                    record['rows_out'] = row_count(outputs[name])
+                    if record['rows_out'] is None:
+                        # stages writing files return paths or a report, the rows they got are written
+                        record['rows_out'] = record.get('rows_in')
+                if stage['cache']:
+                    self._store(name, keys[name], outputs[name])
+                report['computed'].append(name)
+            return outputs[name]
+
+        return {name: resolve(name) for name in targets}, report
+
+
+def read_archive(path):
+    return pd.read_csv(path)
+
+
+def read_images(path):
+    return pd.read_csv(path, sep='\t')
+
+
+def read_api(path):
+    """ API counts from the gathered tweet_json.txt, or from a csv copy of them """
+    if path.endswith('.csv'):
+        return pd.read_csv(path)
+    return read_tweet_json(path)[0]
+
+
+def stored_files(path):
+    """ Files store_master writes for the master table at ``path`` """
+    return [path, os.path.splitext(path)[0] + '.csv', state_path(path), cube_path(path)]
+
+
+def store_master(master, cube, archive, images, api, path):
+    """
+    Save the master table with the cube and the source row hashes next to
+    it, so refresh_master can update what the pipeline stored.
+    """
+    with step('parquet', rows_in=master) as record:
+        save_master(master, path)
+        record['rows_out'] = len(master)
+    with step('state', rows_in=[archive, images, api]) as record:
+        write_state(archive, images, api, path)
+        record['rows_out'] = len(archive)
+    with step('cube', rows_in=cube) as record:
+        save_cube(cube, cube_path(path))
+        record['rows_out'] = len(cube)
+    with step('to_csv', rows_in=master) as record:
+        master.to_csv(os.path.splitext(path)[0] + '.csv', index=False)
+        record['rows_out'] = len(master)
+    return path
+
+
+def relationship_data(master):
+    return master[['retweet_count', 'favorite_count']]
+
+
+def chart_data(cube, retweet_favorite):
+    return chart_inputs(cube, retweet_favorite)
+
+
+def wrangling_pipeline(archive_path='twitter-archive-enhanced.csv',
+                       images_path='image-predictions.tsv', api_path='tweet_json.txt',
+                       master_path=MASTER_PATH, chart_dir='charts', cache_dir=CACHE_DIR):
+    """
+    The notebook as a pipeline: reading the three sources, cleaning and
+    merging them into the master table, storing it, and building the cube,
+    the chart data and the charts.
+    """
+    pipeline = Pipeline(cache_dir)
+    pipeline.add('archive', read_archive, files=[archive_path], params={'path': archive_path})
+    pipeline.add('images', read_images, files=[images_path], params={'path': images_path})
+    pipeline.add('api', read_api, files=[api_path], code=[tweet_json], params={'path': api_path})
+    pipeline.add('master', build_master, inputs=['archive', 'images', 'api'],
+                 code=[cleaning, schema, merge, master_module])
+    pipeline.add('cube', build_cube, inputs=['master'], code=[cube])
+    pipeline.add('store', store_master, inputs=['master', 'cube', 'archive', 'images', 'api'],
+                 params={'path': master_path}, writes=stored_files(master_path))
+    pipeline.add('relationship', relationship_data, inputs=['master'])
+    pipeline.add('chart_data', chart_data, inputs=['cube', 'relationship'], code=[charts])
+    pipeline.add('charts', render_charts, inputs=['chart_data'], params={'out_dir': chart_dir}, cache=False,
+                 forced={'skip_unchanged': False})
+    return pipeline
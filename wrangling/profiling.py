@@ -0,0 +1,165 @@
+"""
+Wall time, CPU time, peak memory and row counts of named pipeline steps.
+
+Steps are recorded by the active ``Profiler``. Code anywhere in the package
+marks a step with ``with step('merge', rows_in=df) as record:`` and may set
+``record['rows_out']``; when no profiler is active this costs nothing. Steps
+nest, and the records can be exported as JSON, as a Chrome trace (open it
+in Perfetto or speedscope) or as folded stacks for flamegraph.pl.
+
+``peak_rss`` is the high-water mark of the whole process when a step ends,
+so it never goes down from one step to the next. The memory a step itself
+took is ``peak_rss_growth``, by how much the step raised that mark.
+"""
+
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_ACTIVE = contextvars.ContextVar('profiler', default=None)
+
+
+def peak_rss():
+    """ Highest resident memory of the process so far, in bytes (None when unknown) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def row_count(data):
+    """ Number of rows of a dataframe, or of all dataframes in a list or dict """
+    if data is None or isinstance(data, int):
+        return data
+    if isinstance(data, dict):
+        data = list(data.values())
+    if isinstance(data, (list, tuple)):
+        counts = [row_count(item) for item in data]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return len(data) if hasattr(data, 'shape') else None
+
+
+class Profiler:
+    """
+    Records of the steps run while the profiler is active, either as
+    ``with profiler:`` or with ``profiler.activate()``.
+    """
+
+    def __init__(self):
+        self.records = []
+        self.origin = time.time()
+        self._stack = []
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_ACTIVE.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _ACTIVE.reset(self._tokens.pop())
+
+    def activate(self):
+        """ Make this the active profiler until ``deactivate`` is called """
+        return self.__enter__()
+
+    def deactivate(self):
+        self.__exit__()
+
+    @contextmanager
+    def step(self, name, rows_in=None):
+        path = [record['name'] for record in self._stack] + [name]
+        record = {'name': name, 'path': ';'.join(path), 'depth': len(self._stack),
+                  'start': time.time() - self.origin, 'wall': None, 'cpu': None, 'child_wall': 0.0,
+                  'peak_rss': None, 'peak_rss_growth': None,
+                  'rows_in': row_count(rows_in), 'rows_out': None, 'pid': os.getpid()}
+        self.records.append(record)
+        self._stack.append(record)
+        rss_before = peak_rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['peak_rss'] = peak_rss()
+            if rss_before is not None:
+                record['peak_rss_growth'] = record['peak_rss'] - rss_before
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]['child_wall'] += record['wall']
+
+    def adopt(self, records, origin):
+        """
+        Add the records of a profiler that ran in another process (with the
+        given ``origin`` time) below the current step of this one.
+        """
+        parent = self._stack[-1] if self._stack else None
+        for record in records:
+            record = dict(record)
+            record['start'] += origin - self.origin
+            if parent is not None:
+                record['path'] = parent['path'] + ';' + record['path']
+                record['depth'] += parent['depth'] + 1
+            self.records.append(record)
+
+    def to_json(self, path=None):
+        """ Records of every step, written to ``path`` when given """
+        records = [{key: value for key, value in record.items() if key != 'child_wall'}
+                   for record in self.records]
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(records, file, indent=2)
+        return records
+
+    def to_trace(self, path=None):
+        """ Chrome trace events of every step, written to ``path`` when given """
+        events = [{'name': record['name'], 'cat': 'step', 'ph': 'X', 'pid': record['pid'],
+                   'tid': record['pid'], 'ts': round(record['start'] * 1e6),
+                   'dur': round((record['wall'] or 0) * 1e6),
+                   'args': {key: record[key] for key in
+                            ('cpu', 'peak_rss', 'peak_rss_growth', 'rows_in', 'rows_out')}}
+                  for record in self.records]
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(trace, file)
+        return trace
+
+    def to_folded(self, path=None):
+        """
+        Folded stacks ('outer;inner microseconds') of the time spent in each
+        step outside its child steps, written to ``path`` when given.
+        """
+        totals = {}
+        for record in self.records:
+            own = max((record['wall'] or 0) - record['child_wall'], 0)
+            totals[record['path']] = totals.get(record['path'], 0) + own
+        lines = [f'{stack} {round(seconds * 1e6)}' for stack, seconds in totals.items()]
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write('\n'.join(lines) + '\n')
+        return lines
+
+
+def active_profiler():
+    return _ACTIVE.get()
+
+
+def step(name, rows_in=None):
+    """
+    Record the enclosed block as step ``name`` of the active profiler. The
+    block gets the step's record, in which it can set ``rows_out``.
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return nullcontext({})
+    return profiler.step(name, rows_in)
@@ -0,0 +1,71 @@
+"""
+Compact column datatypes for the cleaned dataframes and the master table.
+
+Low-cardinality text columns become categoricals, counts and image numbers
+become nullable integers (so the missing values left by the left merges do
+not turn them into floats), and tweet_id stays int64. ``apply_schema`` is
+run on the cleaned frames and again after each merge.
+"""
+
+import pandas as pd
+
+from wrangling.cleaning import DAY_NAMES, MONTH_NAMES, STAGE_PRIORITY
+
+MASTER_SCHEMA = {
+    'tweet_id': 'int64',
+    'source': 'category',
+    'source_url': 'category',
+    'name': 'category',
+    'rating_numerator': 'Int32',
+    'rating_denominator': 'Int32',
+    'text_rating_numerator': 'Float32',
+    'text_rating_denominator': 'Int32',
+    'rating_candidates': 'uint8',
+    'rating_mismatch': 'boolean',
+    'doggo': 'category',
+    'floofer': 'category',
+    'pupper': 'category',
+    'puppo': 'category',
+    'dog_stage': pd.CategoricalDtype(STAGE_PRIORITY),
+    'dog_stage_mask': 'uint8',
+    'day_name': pd.CategoricalDtype(DAY_NAMES, ordered=True),
+    'month': pd.CategoricalDtype(MONTH_NAMES, ordered=True),
+    'image_number': 'Int32',
+    'first_prediction': 'category',
+    'second_prediction': 'category',
+    'third_prediction': 'category',
+    'first_dog': 'boolean',
+    'second_dog': 'boolean',
+    'third_dog': 'boolean',
+    'retweet_count': 'Int64',
+    'favorite_count': 'Int64',
+}
+
+
+def apply_schema(df, schema=MASTER_SCHEMA):
+    """
+    Return the dataframe with every column listed in the schema cast to its
+    datatype. Columns that are absent or already of the right type are left
+    as they are.
+    """
+    dtypes = {column: dtype for column, dtype in schema.items()
+              if column in df.columns and df[column].dtype != pd.api.types.pandas_dtype(dtype)}
+    if not dtypes:
+        return df
+    return df.astype(dtypes)
+
+
+def memory_report(before, after):
+    """
+    Memory used by each column of a dataframe before and after a schema was
+    applied, in bytes, with the total in the last row.
+    """
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'bytes_before': before.memory_usage(deep=True, index=False),
+        'dtype_after': after.dtypes.astype(str),
+        'bytes_after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['total'] = ['', report.bytes_before.sum(), '', report.bytes_after.sum()]
+    report['ratio'] = (report.bytes_before / report.bytes_after).round(1)
+    return report
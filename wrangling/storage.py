@@ -0,0 +1,85 @@
+"""
+Columnar storage of the twitter_archive_master table.
+
+The master table is written as Parquet so the datetime, period, categorical
+and id dtypes set up during cleaning survive the round trip, and the
+analysis stage can read back only the columns a chart needs. The table can
+optionally be partitioned into one directory per ``year_month``.
+"""
+
+import os
+import shutil
+
+import pandas as pd
+
+from wrangling.schema import apply_schema
+
+MASTER_PATH = 'twitter_archive_master.parquet'
+
+
+def save_master(df, path=MASTER_PATH, partition_by=None):
+    """
+    Write the master table to ``path`` as Parquet, replacing any earlier
+    copy. With ``partition_by='year_month'`` one directory is written for
+    each month.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+    if partition_by is None:
+        df.to_parquet(path, index=False)
+        return path
+
+    partition_by = [partition_by] if isinstance(partition_by, str) else list(partition_by)
+    # partition keys end up in directory names, so they are stored as text
+    df = df.assign(**{column: df[column].astype(str) for column in partition_by
+                      if isinstance(df[column].dtype, pd.PeriodDtype)})
+    df.to_parquet(path, index=False, partition_cols=partition_by)
+    return path
+
+
+def load_master(path=MASTER_PATH, columns=None, filters=None):
+    """
+    Read the master table, or only ``columns`` of it. ``filters`` is passed
+    to the Parquet reader, e.g. ``[('year_month', '=', '2017-07')]`` to read
+    a single partition.
+    """
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    # year_month read back from partition directories comes as text categories
+    if 'year_month' in df.columns and not isinstance(df['year_month'].dtype, pd.PeriodDtype):
+        df['year_month'] = pd.PeriodIndex(df['year_month'].astype(str), freq='M')
+    return df
+
+
+def upsert_master(rows, path=MASTER_PATH, remove_ids=(), partition_by=None, key='tweet_id'):
+    """
+    Replace the stored rows that share a ``key`` with ``rows``, add the new
+    ones and remove ``remove_ids``. For a table partitioned by year_month
+    only the partitions holding affected tweets are read and rewritten.
+    """
+    if not os.path.exists(path):
+        return save_master(rows, path, partition_by=partition_by)
+    replaced = pd.Index(rows[key]).union(pd.Index(remove_ids, dtype=rows[key].dtype))
+
+    if partition_by is None:
+        existing = load_master(path)
+        updated = pd.concat([existing[~existing[key].isin(replaced)], rows], ignore_index=True)
+        return save_master(apply_schema(updated), path)
+
+    stored = load_master(path, columns=[key, partition_by])
+    months = set(rows[partition_by].astype(str)) | set(
+        stored.loc[stored[key].isin(replaced), partition_by].astype(str))
+    if not months:
+        return path
+    existing = load_master(path, filters=[(partition_by, 'in', sorted(months))])
+    updated = apply_schema(pd.concat([existing[~existing[key].isin(replaced)], rows], ignore_index=True))
+    updated[partition_by] = updated[partition_by].astype(str)
+
+    # partitions left without any rows would not be overwritten, so remove them first
+    for month in months - set(updated[partition_by]):
+        shutil.rmtree(os.path.join(path, f'{partition_by}={month}'), ignore_errors=True)
+    updated.to_parquet(path, index=False, partition_cols=[partition_by],
+                       existing_data_behavior='delete_matching')
+    return path
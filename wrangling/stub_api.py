@@ -0,0 +1,214 @@
+"""
+Local stand-in for the Twitter API, for gathering without network or
+credentials.
+
+``StubTwitterAPI`` serves ``statuses/show`` and ``statuses/lookup`` from a
+local HTTP server, with tweets built from ``tweeter_api_df.csv`` or read
+from ``tweet_json.txt``. Every response waits a configurable latency, and
+the server sends ``x-rate-limit-*`` headers for a fixed request window,
+answers 429 when the window is used up, 404 (or null in lookups) for
+deleted tweets and, at a chosen rate, transient 5xx errors. Pointing
+``gather_tweets`` at ``stub.base_url`` load tests its batching, concurrency
+and backoff. From the command line:
+
+    python -m wrangling.stub_api --tweets tweeter_api_df.csv --port 8000 --latency 0.05
+"""
+
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from wrangling.gather import LOOKUP_BATCH_SIZE, RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW
+from wrangling.json_backend import dumps, loads
+
+ERROR_STATUS_CODES = [500, 502, 503, 504]
+
+
+def load_tweets(path='tweeter_api_df.csv'):
+    """
+    Tweets by id, from the csv of API counts (as minimal tweet objects) or
+    from a JSON lines file of full tweets such as tweet_json.txt.
+    """
+    if path.endswith('.csv'):
+        df = pd.read_csv(path)
+        return {int(row.tweet_id): {'id': int(row.tweet_id), 'id_str': str(row.tweet_id),
+                                    'retweet_count': int(row.retweet_count),
+                                    'favorite_count': int(row.favorite_count)}
+                for row in df.itertuples(index=False)}
+    tweets = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                tweet = loads(line)
+                tweets[int(tweet['id'])] = tweet
+    return tweets
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.server.stub.handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubTwitterAPI:
+    """
+    Local API server, run in a background thread with ``start`` / ``stop``
+    or as a context manager. ``stats`` counts the requests per endpoint and
+    the responses per status code.
+    """
+
+    def __init__(self, tweets, latency=0.0, jitter=0.0, rate_limit=RATE_LIMIT_REQUESTS,
+                 window=RATE_LIMIT_WINDOW, error_rate=0.0, deleted=(), seed=0,
+                 host='127.0.0.1', port=0):
+        self.tweets = tweets
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.window = window
+        self.error_rate = error_rate
+        self.deleted = {int(tweet_id) for tweet_id in deleted}
+        self.stats = {'requests': {}, 'responses': {}}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/1.1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def tweet(self, tweet_id):
+        """ The tweet with this id, or None when it does not exist or was deleted """
+        return None if tweet_id in self.deleted else self.tweets.get(tweet_id)
+
+    def _rate_limit(self, endpoint):
+        """
+        Count a request in the endpoint's window and return the requests
+        remaining, the time the window resets and the 5xx status to fail with, if any.
+        """
+        now = time.time()
+        with self._lock:
+            start, used = self._windows.get(endpoint, (now, 0))
+            if now >= start + self.window:
+                start, used = now, 0
+            used += 1
+            self._windows[endpoint] = (start, used)
+            transient = self._random.random() < self.error_rate
+            error = self._random.choice(ERROR_STATUS_CODES) if transient else None
+        return self.rate_limit - used, start + self.window, error
+
+    def _count(self, key, value):
+        with self._lock:
+            self.stats[key][value] = self.stats[key].get(value, 0) + 1
+
+    def handle(self, request):
+        """ Answer one GET request """
+        url = urlsplit(request.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.removeprefix('/1.1')
+        if path.startswith('/statuses/show'):
+            endpoint = '/statuses/show'
+            # the id is either a query parameter or part of the path (/statuses/show/<id>.json)
+            query.setdefault('id', path.removeprefix('/statuses/show').strip('/').removesuffix('.json'))
+        elif path == '/statuses/lookup.json':
+            endpoint = '/statuses/lookup'
+        else:
+            return self._send(request, 404, {'errors': [{'code': 34, 'message': 'Sorry, that page does not exist.'}]})
+        self._count('requests', endpoint)
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        remaining, reset, error = self._rate_limit(endpoint)
+        headers = {'x-rate-limit-limit': self.rate_limit, 'x-rate-limit-remaining': max(remaining, 0),
+                   'x-rate-limit-reset': int(reset)}
+        if remaining < 0:
+            return self._send(request, 429, {'errors': [{'code': 88, 'message': 'Rate limit exceeded'}]}, headers)
+        if error is not None:
+            return self._send(request, error, {'errors': [{'code': 131, 'message': 'Internal error'}]}, headers)
+
+        try:
+            ids = [int(tweet_id) for tweet_id in query.get('id', '').split(',') if tweet_id]
+        except ValueError:
+            ids = []
+        if not ids or (endpoint == '/statuses/show' and len(ids) > 1) or len(ids) > LOOKUP_BATCH_SIZE:
+            return self._send(request, 400, {'errors': [{'code': 44, 'message': 'id parameter is invalid.'}]}, headers)
+
+        if endpoint == '/statuses/show':
+            tweet = self.tweet(ids[0])
+            if tweet is None:
+                return self._send(request, 404, {'errors': [{'code': 144, 'message': 'No status found with that ID.'}]},
+                                  headers)
+            return self._send(request, 200, tweet, headers)
+        if query.get('map') == 'true':
+            return self._send(request, 200, {'id': {str(tweet_id): self.tweet(tweet_id) for tweet_id in ids}}, headers)
+        return self._send(request, 200, [tweet for tweet in map(self.tweet, ids) if tweet is not None], headers)
+
+    def _send(self, request, status, body, headers=None):
+        self._count('responses', status)
+        data = dumps(body).encode()
+        request.send_response(status)
+        request.send_header('content-type', 'application/json;charset=utf-8')
+        request.send_header('content-length', str(len(data)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, str(value))
+        request.end_headers()
+        request.wfile.write(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tweets', default='tweeter_api_df.csv',
+                        help='csv of API counts or JSON lines file of tweets')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra latency, up to this many seconds')
+    parser.add_argument('--rate-limit', type=int, default=RATE_LIMIT_REQUESTS, help='requests per window')
+    parser.add_argument('--window', type=float, default=RATE_LIMIT_WINDOW, help='rate limit window in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 5xx error')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    stub = StubTwitterAPI(load_tweets(args.tweets), latency=args.latency, jitter=args.jitter,
+                          rate_limit=args.rate_limit, window=args.window, error_rate=args.error_rate,
+                          seed=args.seed, host=args.host, port=args.port)
+    print(f"serving {len(stub.tweets)} tweets at {stub.base_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
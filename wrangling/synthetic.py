@@ -0,0 +1,109 @@
+"""
+Synthetic WeRateDogs archives of any size for benchmarking.
+
+The three datasets shipped with the repo serve as templates. Whole rows of
+each template are drawn at random with replacement, so the schemas and the
+value distributions (stage flags, source anchors, rating texts, timestamps,
+prediction names and confidences, counts) and the correlations between
+columns stay those of the real data. Only the tweet ids are new. As in the
+real data, some archive tweets have no image predictions and a few have no
+API counts.
+"""
+
+import numpy as np
+import pandas as pd
+
+ARCHIVE_TEMPLATE = 'twitter-archive-enhanced.csv'
+IMAGES_TEMPLATE = 'image-predictions (1).tsv'
+API_TEMPLATE = 'tweeter_api_df.csv'
+
+FIRST_TWEET_ID = 660000000000000000
+
+
+def load_templates(archive_path=ARCHIVE_TEMPLATE, images_path=IMAGES_TEMPLATE, api_path=API_TEMPLATE):
+    return pd.read_csv(archive_path), pd.read_csv(images_path, sep='\t'), pd.read_csv(api_path)
+
+
+def resample(template, ids, rng):
+    """ Rows of ``template`` drawn with replacement, one for each of ``ids`` """
+    rows = template.take(rng.integers(0, len(template), len(ids))).reset_index(drop=True)
+    rows['tweet_id'] = ids
+    return rows
+
+
+def synthetic_archives(rows, templates=None, seed=0):
+    """
+    Archive, image prediction and API dataframes with ``rows`` archive
+    tweets, shaped like the ``templates`` (the repo's datasets by default).
+    The same ``seed`` gives the same dataframes.
+    """
+    archive, images, api = templates if templates is not None else load_templates()
+    rng = np.random.default_rng(seed)
+    ids = FIRST_TWEET_ID + np.cumsum(rng.integers(1, 1 << 20, rows, dtype=np.int64))
+
+    # share of the archive tweets found in the other two datasets
+    image_ids = ids[rng.random(rows) < archive.tweet_id.isin(images.tweet_id).mean()]
+    api_ids = ids[rng.random(rows) < archive.tweet_id.isin(api.tweet_id).mean()]
+    return (resample(archive, ids, rng),
+            resample(images, image_ids, rng),
+            resample(api, api_ids, rng))
+
+
+WERATEDOGS_USER = {
+    'id': 4196983835, 'id_str': '4196983835', 'name': 'WeRateDogs™', 'screen_name': 'dog_rates',
+    'location': 'DM YOUR DOGS, WE WILL RATE', 'url': 'https://t.co/N7sNNHAEXS',
+    'description': 'Your Only Source for Professional Dog Ratings Instagram and Facebook ➪ WeRateDogs',
+    'entities': {'url': {'urls': [{'url': 'https://t.co/N7sNNHAEXS', 'expanded_url': 'http://weratedogs.com',
+                                   'display_url': 'weratedogs.com', 'indices': [0, 23]}]},
+                 'description': {'urls': []}},
+    'protected': False, 'followers_count': 3200889, 'friends_count': 104, 'listed_count': 2784,
+    'created_at': 'Sun Nov 15 21:41:29 +0000 2015', 'favourites_count': 114031, 'utc_offset': None,
+    'time_zone': None, 'geo_enabled': True, 'verified': True, 'statuses_count': 5288, 'lang': 'en',
+    'contributors_enabled': False, 'is_translator': False, 'is_translation_enabled': False,
+    'profile_background_color': '000000', 'profile_image_url_https':
+        'https://pbs.twimg.com/profile_images/861235569119830016/wcnsXYy-_normal.jpg',
+    'profile_banner_url': 'https://pbs.twimg.com/profile_banners/4196983835/1501129017',
+    'profile_link_color': 'F5ABB5', 'profile_text_color': '000000', 'profile_use_background_image': False,
+    'has_extended_profile': True, 'default_profile': False, 'default_profile_image': False,
+    'following': False, 'follow_request_sent': False, 'notifications': False, 'translator_type': 'none',
+}
+
+MEDIA_SIZES = {'thumb': {'w': 150, 'h': 150, 'resize': 'crop'}, 'large': {'w': 540, 'h': 528, 'resize': 'fit'},
+               'medium': {'w': 540, 'h': 528, 'resize': 'fit'}, 'small': {'w': 540, 'h': 528, 'resize': 'fit'}}
+
+
+def _tweet(tweet_id, created_at, text, source, retweets, favorites, image):
+    """ Extended mode tweet object as returned by statuses/lookup """
+    media = [] if image is None else [{
+        'id': tweet_id, 'id_str': str(tweet_id), 'indices': [len(text) - 23, len(text)],
+        'media_url': image.replace('https', 'http'), 'media_url_https': image, 'url': text[-23:],
+        'display_url': 'pic.twitter.com/' + str(tweet_id)[-10:], 'type': 'photo', 'sizes': MEDIA_SIZES,
+        'expanded_url': f'https://twitter.com/dog_rates/status/{tweet_id}/photo/1'}]
+    return {
+        'created_at': created_at, 'id': tweet_id, 'id_str': str(tweet_id), 'full_text': text,
+        'truncated': False, 'display_text_range': [0, len(text)],
+        'entities': {'hashtags': [], 'symbols': [], 'user_mentions': [], 'urls': [], 'media': media},
+        'extended_entities': {'media': media}, 'source': source,
+        'in_reply_to_status_id': None, 'in_reply_to_status_id_str': None, 'in_reply_to_user_id': None,
+        'in_reply_to_user_id_str': None, 'in_reply_to_screen_name': None, 'user': WERATEDOGS_USER,
+        'geo': None, 'coordinates': None, 'place': None, 'contributors': None, 'is_quote_status': False,
+        'retweet_count': retweets, 'favorite_count': favorites, 'favorited': False, 'retweeted': False,
+        'possibly_sensitive': False, 'possibly_sensitive_appealable': False, 'lang': 'en',
+    }
+
+
+def synthetic_tweets(rows, templates=None, seed=0):
+    """
+    Full extended mode tweet objects shaped like those of the gatherer, for
+    the synthetic archive of ``rows`` tweets (texts, times and sources from
+    the archive, counts from the API data, image urls from the predictions).
+    """
+    archive, images, api = synthetic_archives(rows, templates, seed)
+    created = pd.to_datetime(archive.timestamp, format='mixed', utc=True).dt.strftime('%a %b %d %H:%M:%S +0000 %Y')
+    counts = api.set_index('tweet_id').reindex(archive.tweet_id).fillna(0).astype('int64')
+    image_urls = images.set_index('tweet_id').jpg_url.reindex(archive.tweet_id).astype(object)
+    return [_tweet(int(tweet_id), created_at, text, source, int(retweets), int(favorites),
+                   None if pd.isna(image) else image)
+            for tweet_id, created_at, text, source, retweets, favorites, image
+            in zip(archive.tweet_id, created, archive.text, archive.source,
+                   counts.retweet_count, counts.favorite_count, image_urls)]
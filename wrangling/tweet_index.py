@@ -0,0 +1,172 @@
+"""
+Random access to the tweets of ``tweet_json.txt`` through a memory map.
+
+``TweetIndex`` maps the JSON lines file into memory and keeps a sidecar
+index (``tweet_json.txt.index.npz``) of the byte offset and length of the
+line of each tweet_id, sorted by id. Looking up single tweets or a subset
+of ids decodes only those lines out of the mapped file instead of reading
+the whole file. The gatherer appends to the file, so when the file has
+grown since the index was written only the new lines are indexed. A last
+line without its newline may still be being written, so it is left for the
+next update.
+"""
+
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from wrangling.json_backend import loads as fast_loads
+from wrangling.tweet_json import PROJECTION_ERRORS, _column, _projection
+
+INDEX_SUFFIX = '.index.npz'
+
+# newlines are searched for in blocks of this many bytes
+SCAN_BLOCK = 64 * 1024 * 1024
+
+# bytes before the indexed end that must be unchanged for an append-only update
+TAIL_CHECK = 256
+
+
+def line_spans(buffer, start=0, block=SCAN_BLOCK):
+    """
+    Offsets and lengths of the newline terminated lines of ``buffer`` from
+    ``start`` on, without the newlines
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    ends = [np.flatnonzero(data[position:position + block] == ord('\n')) + position
+            for position in range(start, len(data), block)]
+    ends = np.concatenate(ends) if ends else np.array([], dtype=np.int64)
+    starts = np.concatenate([[start], ends[:-1] + 1]) if len(ends) else ends
+    return starts.astype(np.int64), (ends - starts).astype(np.int64)
+
+
+class TweetIndex:
+    """
+    Index of a JSON lines file of tweets by ``id_field``. Tweets are decoded
+    with ``loads`` from the mapped file. ``errors`` lists the
+    ``(line_number, message)`` of the lines that could not be indexed when
+    the index was built or extended.
+    """
+
+    def __init__(self, path='tweet_json.txt', index_path=None, id_field='id', loads=fast_loads):
+        self.path = path
+        self.index_path = index_path or path + INDEX_SUFFIX
+        self.id_field = id_field
+        self.loads = loads
+        self.errors = []
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        # empty files cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._load_or_build()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, tweet_id):
+        return self._position(tweet_id) is not None
+
+    def _load_or_build(self):
+        """ Read the sidecar index and extend it with lines appended since, or build it """
+        size = len(self._map)
+        indexed, lines, loaded = 0, 0, False
+        self.ids = np.array([], dtype=np.int64)
+        self.offsets = np.array([], dtype=np.int64)
+        self.lengths = np.array([], dtype=np.int64)
+        if os.path.exists(self.index_path):
+            stored = np.load(self.index_path)
+            tail = bytes(stored['tail'])
+            end = int(stored['size'])
+            if end <= size and self._map[end - len(tail):end] == tail:
+                indexed, lines, loaded = end, int(stored['lines']), True
+                self.ids, self.offsets, self.lengths = stored['ids'], stored['offsets'], stored['lengths']
+
+        starts, lengths = line_spans(self._map, indexed)
+        if loaded and not len(starts):
+            return
+        # the index ends after the last newline, a partly appended line is indexed once it is complete
+        end = int(starts[-1] + lengths[-1] + 1) if len(starts) else indexed
+        ids = np.empty(len(starts), dtype=np.int64)
+        valid = np.zeros(len(starts), dtype=bool)
+        for i, (start, length) in enumerate(zip(starts, lengths)):
+            line = self._map[start:start + length]
+            if not line.strip():
+                continue
+            try:
+                ids[i] = int(self.loads(line)[self.id_field])
+                valid[i] = True
+            except (ValueError, KeyError, TypeError) as e:
+                self.errors.append((lines + i + 1, f'{type(e).__name__}: {e}'))
+
+        ids = np.concatenate([self.ids, ids[valid]])
+        offsets = np.concatenate([self.offsets, starts[valid]])
+        lengths = np.concatenate([self.lengths, lengths[valid]])
+        # a tweet gathered again keeps its latest line
+        order = np.argsort(offsets, kind='stable')[::-1]
+        ids, offsets, lengths = ids[order], offsets[order], lengths[order]
+        ids, first = np.unique(ids, return_index=True)
+        self.ids, self.offsets, self.lengths = ids, offsets[first], lengths[first]
+        self._save(end, lines + len(starts))
+
+    def _save(self, size, lines):
+        tail = np.frombuffer(self._map[max(0, size - TAIL_CHECK):size], dtype=np.uint8)
+        temporary = self.index_path + '.tmp.npz'
+        np.savez(temporary, ids=self.ids, offsets=self.offsets, lengths=self.lengths,
+                 size=np.int64(size), lines=np.int64(lines), tail=tail)
+        os.replace(temporary, self.index_path)
+
+    def _position(self, tweet_id):
+        position = np.searchsorted(self.ids, tweet_id)
+        if position < len(self.ids) and self.ids[position] == tweet_id:
+            return position
+        return None
+
+    def _decode(self, position):
+        start = self.offsets[position]
+        return self.loads(self._map[start:start + self.lengths[position]])
+
+    def get(self, tweet_id):
+        """ The tweet with this id, or None when it is not in the file """
+        position = self._position(int(tweet_id))
+        return None if position is None else self._decode(position)
+
+    def lookup(self, ids):
+        """ Tweets of the given ids that are in the file, by id """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        positions = np.searchsorted(self.ids, ids).clip(max=max(len(self.ids) - 1, 0))
+        found = self.ids[positions] == ids if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        positions = positions[found]
+        # reading in file order keeps the accesses to the map sequential
+        positions = positions[np.argsort(self.offsets[positions], kind='stable')]
+        return {int(self.ids[position]): self._decode(position) for position in positions}
+
+    def select(self, ids, columns=None, dtypes=None):
+        """
+        Dataframe of the projected fields (as in read_tweet_json) of the
+        tweets of the given ids that are in the file, and a list of
+        ``(tweet_id, message)`` tuples for every tweet missing one of the
+        fields or holding a value that does not convert to its column dtype.
+        """
+        names, column_dtypes, project = _projection(columns, dtypes)
+        rows, errors = [], []
+        for tweet_id, tweet in self.lookup(ids).items():
+            try:
+                rows.append(project(tweet))
+            except PROJECTION_ERRORS as e:
+                errors.append((tweet_id, f'{type(e).__name__}: {e}'))
+        data = {name: _column([row[position] for row in rows], dtype)
+                for position, (name, dtype) in enumerate(zip(names, column_dtypes))}
+        return pd.DataFrame(data, columns=names), errors
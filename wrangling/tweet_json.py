@@ -0,0 +1,142 @@
+"""
+Streaming reader for the ``tweet_json.txt`` file written by the gatherer.
+
+Only the projected fields are pulled out of each tweet. They are collected
+into typed column arrays one chunk of lines at a time, so memory grows with
+the selected columns rather than with the full tweet payloads. Lines that
+cannot be parsed, or whose fields do not fit their column dtypes, are
+counted and reported by line number.
+"""
+
+import numpy as np
+import pandas as pd
+
+from wrangling.json_backend import loads as fast_loads
+
+# output column -> field path in the tweet json (dots walk nested objects)
+DEFAULT_PROJECTION = {
+    'tweet_id': 'id',
+    'retweet_count': 'retweet_count',
+    'favorite_count': 'favorite_count',
+}
+
+FIELD_DTYPES = {
+    'id': np.int64,
+    'retweet_count': np.int64,
+    'favorite_count': np.int64,
+    'favorite': np.bool_,
+    'retweeted': np.bool_,
+    'display_text_range': object,
+    'user.followers_count': np.int64,
+    'user.friends_count': np.int64,
+}
+
+# errors of tweets that are malformed or do not fit the projection
+PROJECTION_ERRORS = (ValueError, KeyError, TypeError, OverflowError)
+
+
+def _getter(path):
+    """ Return a function pulling a (possibly nested) field out of a tweet """
+    keys = path.split('.')
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda tweet: tweet[key]
+
+    def get(tweet):
+        for key in keys:
+            tweet = tweet[key]
+        return tweet
+    return get
+
+
+def _converter(name, dtype):
+    """ Return a function converting a field value to ``dtype``, or None for object columns """
+    dtype = np.dtype(dtype)
+    if dtype == object:
+        return None
+
+    def convert(value):
+        # numpy would silently turn nulls into False and lists into arrays
+        if (value is None and dtype.kind != 'f') or isinstance(value, (list, dict)) \
+                or (dtype.kind == 'b' and not isinstance(value, bool)):
+            raise TypeError(f'{name} is {type(value).__name__}, not {dtype}')
+        return dtype.type(value)
+    return convert
+
+
+def _projection(columns=None, dtypes=None):
+    """
+    Output column names and dtypes of a projection (see read_tweet_json),
+    and a function returning the converted values of one tweet, which raises
+    one of PROJECTION_ERRORS when a field is missing or does not convert.
+    """
+    if columns is None:
+        columns = DEFAULT_PROJECTION
+    elif not isinstance(columns, dict):
+        columns = {'tweet_id' if field == 'id' else field: field for field in columns}
+    dtypes = dtypes or {}
+    names = list(columns)
+    getters = [_getter(columns[name]) for name in names]
+    column_dtypes = [dtypes.get(name, FIELD_DTYPES.get(columns[name], object)) for name in names]
+    converters = [_converter(name, dtype) for name, dtype in zip(names, column_dtypes)]
+
+    def project(tweet):
+        values = [get(tweet) for get in getters]
+        return [value if convert is None else convert(value) for value, convert in zip(values, converters)]
+    return names, column_dtypes, project
+
+
+def _column(values, dtype):
+    """ Array of the values of one output column """
+    if np.dtype(dtype) != object:
+        return np.array(values, dtype=dtype)
+    # filled one by one, as numpy would turn lists of equal length into a second dimension
+    column = np.empty(len(values), dtype=object)
+    for position, value in enumerate(values):
+        column[position] = value
+    return column
+
+
+def read_tweet_json(path='tweet_json.txt', columns=None, chunk_size=10000,
+                    dtypes=None, loads=fast_loads):
+    """
+    Read the projected fields of every tweet in a JSON lines file.
+
+    ``columns`` maps output column names to field paths; a list of field
+    paths may be given instead. Fields default to the dtype in FIELD_DTYPES
+    (object when unknown), which ``dtypes`` can override per output column.
+
+    Returns the DataFrame and a list of ``(line_number, message)`` tuples for
+    every line that was malformed, missing one of the projected fields or
+    holding a value that does not convert to its column dtype.
+    """
+    names, column_dtypes, project = _projection(columns, dtypes)
+    chunks = {name: [] for name in names}
+    buffers = [[] for _ in names]
+    errors = []
+
+    def flush():
+        for name, buffer, dtype in zip(names, buffers, column_dtypes):
+            if buffer:
+                chunks[name].append(_column(buffer, dtype))
+                buffer.clear()
+
+    # lines are handed to the decoder as bytes, which spares decoding them to str first
+    with open(path, 'rb') as file:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                values = project(loads(line))
+            except PROJECTION_ERRORS as e:
+                errors.append((line_number, f'{type(e).__name__}: {e}'))
+                continue
+            for buffer, value in zip(buffers, values):
+                buffer.append(value)
+            if len(buffers[0]) >= chunk_size:
+                flush()
+    flush()
+
+    data = {name: (np.concatenate(chunks[name]) if chunks[name] else np.array([], dtype=dtype))
+            for name, dtype in zip(names, column_dtypes)}
+    return pd.DataFrame(data, columns=names), errors